@@ -0,0 +1,50 @@
+"""
+benchmarks.runの2つの結果を計測名ごとに比較する
+
+例: python -m benchmarks.compare base.json new.json --threshold 1.1
+最良値の比(new / base)がthresholdを超えた計測があれば、終了コード1で終了する
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+
+def _format(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds:.4f}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.1, help="劣化とみなす所要時間の比")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = {r["name"]: r for r in json.load(f)["results"]}
+    with open(args.new) as f:
+        new = {r["name"]: r for r in json.load(f)["results"]}
+
+    regressed = []
+    print(f"{'name':50s} {'base':>10s} {'new':>10s} {'ratio':>7s}")
+    for name in sorted(base.keys() | new.keys()):
+        base_best = base.get(name, {}).get("best")
+        new_best = new.get(name, {}).get("best")
+        if base_best is None or new_best is None:
+            print(f"{name:50s} {_format(base_best):>10s} {_format(new_best):>10s}")
+            continue
+        ratio = new_best / base_best
+        mark = " *" if ratio > args.threshold else ""
+        print(f"{name:50s} {base_best:10.4f} {new_best:10.4f} {ratio:7.2f}{mark}")
+        if mark:
+            regressed.append(name)
+
+    if regressed:
+        print(f"{len(regressed)} benchmarks regressed over {args.threshold}x", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
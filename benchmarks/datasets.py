@@ -0,0 +1,155 @@
+import os
+import string
+from typing import Dict, List, Tuple
+
+import fastparquet
+import numpy as np
+import pandas as pd
+
+from tasks.constant import MySQLConstant
+from tasks.models.model import ColumnSchema, TableSchema
+
+# (カラム名, MySQLの型, NULL許容, プライマリーキー, 生成する値の種類)
+# tests/tasks/test_etl_task.py のcountry・cityと同じ定義。文字列カラムの長さはwidthに合わせて広げる
+_COUNTRY_COLUMNS = [
+    ("Code", "char", False, True, "code"),
+    ("Name", "char", False, False, "text"),
+    ("Continent", "enum", False, False, "continent"),
+    ("Region", "char", False, False, "text"),
+    ("SurfaceArea", "decimal", False, False, "decimal"),
+    ("IndepYear", "smallint", True, False, "year"),
+    ("Population", "int", False, False, "int"),
+    ("LifeExpectancy", "decimal", True, False, "decimal_small"),
+    ("GNP", "decimal", True, False, "decimal"),
+    ("GNPOld", "decimal", True, False, "decimal"),
+    ("LocalName", "char", False, False, "text"),
+    ("GovernmentForm", "char", False, False, "text"),
+    ("HeadOfState", "char", True, False, "text"),
+    ("Capital", "int", True, False, "int"),
+    ("Code2", "char", False, False, "code2"),
+    ("timestamp", "timestamp", False, False, "datetime"),
+    ("time", "time", False, False, "time"),
+    ("date", "date", False, False, "date"),
+    ("year", "year", False, False, "year"),
+    ("datetime", "datetime", False, False, "datetime"),
+]
+_CITY_COLUMNS = [
+    ("ID", "int", False, True, "id"),
+    ("Name", "char", False, False, "text"),
+    ("CountryCode", "char", False, False, "country_code"),
+    ("District", "char", False, False, "text"),
+    ("Population", "int", False, False, "int"),
+]
+_CONTINENTS = ["Asia", "Europe", "North America", "Africa", "Oceania", "Antarctica", "South America"]
+_COLUMN_DEFINITIONS = {
+    "continent": "enum({})".format(",".join(f"'{c}'" for c in _CONTINENTS)),
+    "decimal": "decimal(12,2)",
+    "decimal_small": "decimal(3,1)",
+}
+
+# countryのプライマリーキーはchar(3)のため、行数はこれ以下とする
+MAX_COUNTRY_ROWS = 26**3
+
+
+class SyntheticDataset:
+    """
+    country・cityのスキーマに沿った再現可能な合成データ
+
+    rows: cityの行数。countryはMAX_COUNTRY_ROWS行までとする
+    width: 文字列カラムの値の長さ
+    null_ratio: キー以外のカラムを空にする割合。CSVでは空文字、Parquetでは空文字の値となる
+    seed: 乱数のシード。同じ引数からは同じデータを生成する
+    """
+
+    def __init__(self, rows: int, width: int = 16, null_ratio: float = 0.1, seed: int = 0):
+        if not 0 <= null_ratio < 1:
+            raise ValueError("null_ratio must be in [0, 1).")
+        self.rows = rows
+        self.width = width
+        self.null_ratio = null_ratio
+        self.seed = seed
+
+    @property
+    def tables(self) -> Dict[str, List[Tuple]]:
+        return {"country": _COUNTRY_COLUMNS, "city": _CITY_COLUMNS}
+
+    def frame(self, table_name: str) -> pd.DataFrame:
+        rng = np.random.default_rng(self.seed)
+        n = min(self.rows, MAX_COUNTRY_ROWS) if table_name == "country" else self.rows
+        data = {}
+        for name, _, _, is_primary_key, kind in self.tables[table_name]:
+            values = self._values(rng, kind, n)
+            if not is_primary_key and self.null_ratio > 0:
+                values = np.where(rng.random(n) < self.null_ratio, "", values)
+            data[name] = values
+        return pd.DataFrame(data).astype(str)
+
+    def table_schema(self, table_name: str) -> TableSchema:
+        return TableSchema(
+            table_name,
+            [
+                ColumnSchema(name, MySQLConstant.information_schema_type_codes[data_type], is_nullable, is_primary_key)
+                for name, data_type, is_nullable, is_primary_key, _ in self.tables[table_name]
+            ],
+        )
+
+    def ddl(self, table_name: str) -> str:
+        columns = []
+        for name, data_type, is_nullable, _, kind in self.tables[table_name]:
+            if data_type == "char":
+                definition = f"char({max(self.width, 3)})"
+            else:
+                definition = _COLUMN_DEFINITIONS.get(kind, data_type)
+            columns.append(f"`{name}` {definition} {'NULL' if is_nullable else 'NOT NULL'}")
+        pk_columns = [f"`{c[0]}`" for c in self.tables[table_name] if c[3]]
+        columns.append(f"PRIMARY KEY ({','.join(pk_columns)})")
+        return f"CREATE TABLE `{table_name}` ({', '.join(columns)}) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+
+    def write(self, directory: str) -> Dict[str, str]:
+        """全テーブルをCSV・Parquetで書き出し、{"<テーブル名>.<拡張子>": パス}を返す"""
+        paths = {}
+        for table_name in self.tables:
+            df = self.frame(table_name)
+            csv_path = os.path.join(directory, f"{table_name}.csv")
+            df.to_csv(csv_path, index=False)
+            parquet_path = os.path.join(directory, f"{table_name}.parquet")
+            fastparquet.write(parquet_path, df, row_group_offsets=100_000)
+            paths[f"{table_name}.csv"] = csv_path
+            paths[f"{table_name}.parquet"] = parquet_path
+        return paths
+
+    def _values(self, rng: np.random.Generator, kind: str, n: int) -> np.ndarray:
+        letters = np.array(list(string.ascii_uppercase))
+        match kind:
+            case "id":
+                return np.arange(1, n + 1)
+            case "code":
+                i = np.arange(n)
+                return np.char.add(np.char.add(letters[i // 676 % 26], letters[i // 26 % 26]), letters[i % 26])
+            case "country_code":
+                i = rng.integers(0, min(self.rows, MAX_COUNTRY_ROWS), n)
+                return np.char.add(np.char.add(letters[i // 676 % 26], letters[i // 26 % 26]), letters[i % 26])
+            case "code2":
+                return np.char.add(letters[rng.integers(0, 26, n)], letters[rng.integers(0, 26, n)])
+            case "text":
+                alphabet = np.array(list(string.ascii_letters + string.digits + " "))
+                chars = alphabet[rng.integers(0, len(alphabet), (n, self.width))]
+                return chars.view(f"<U{self.width}").ravel()
+            case "continent":
+                return np.array(_CONTINENTS)[rng.integers(0, len(_CONTINENTS), n)]
+            case "int":
+                return rng.integers(0, 10_000_000, n)
+            case "decimal":
+                return np.round(rng.random(n) * 1_000_000, 2)
+            case "decimal_small":
+                return np.round(rng.random(n) * 99, 1)
+            case "year":
+                return rng.integers(1901, 2155, n)
+            case "date":
+                return (np.datetime64("1970-01-01") + rng.integers(0, 20_000, n)).astype(str)
+            case "time":
+                return pd.to_datetime(rng.integers(0, 86_400, n), unit="s").strftime("%H:%M:%S").to_numpy()
+            case "datetime":
+                return pd.to_datetime(rng.integers(31_536_000, 10**9, n), unit="s").strftime("%Y-%m-%d %H:%M:%S").to_numpy()
+            case _:
+                raise ValueError(f"unknown kind: {kind}")
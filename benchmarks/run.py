@@ -0,0 +1,294 @@
+"""
+読み込み・パース・書き込みの各経路と、タスク全体の処理時間を計測する
+
+例: python -m benchmarks.run --rows 100000 --output result.json
+    python -m benchmarks.run --rows 100000 --mysql  # config.tomlのMySQLに対して計測する
+結果はJSONで出力し、benchmarks.compareで比較できる
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
+from unittest.mock import patch
+
+import fastparquet
+import numpy as np
+import pandas as pd
+import pymysql
+
+from benchmarks.datasets import SyntheticDataset
+from benchmarks.stand_in import StandInEngine
+from tasks.data_formatter import CSVFormatter, ParquetFormatter
+from tasks.data_reader import LocalReader
+from tasks.engines.factory import DBFactory
+from tasks.etl_task import DDLTask, DMLTask
+from tasks.source_cache import ParsedSourceCache
+from tasks.models.operation import DataSrc, InsertMethod, OperationTarget, OperationType
+
+BENCH_DB_NAME = "bench"
+
+
+def measure(
+    name: str,
+    func: Callable[[], Any],
+    rows: int,
+    nbytes: int,
+    repeat: int,
+    setup: Optional[Callable[[], Any]] = None,
+) -> Dict[str, Any]:
+    """funcをrepeat回実行し、所要時間を返す。setupは各回の前に実行し、計測には含めない"""
+    seconds: List[float] = []
+    error = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            error = repr(e)
+            break
+        seconds.append(time.perf_counter() - start)
+    best = min(seconds) if seconds else None
+    result = {
+        "name": name,
+        "rows": rows,
+        "bytes": nbytes,
+        "repeat": len(seconds),
+        "seconds": seconds,
+        "best": best,
+        "median": statistics.median(seconds) if seconds else None,
+        "rows_per_sec": rows / best if best else None,
+        "mb_per_sec": nbytes / best / 1024 / 1024 if best and nbytes else None,
+        "error": error,
+    }
+    print(f"{name:50s} {best or float('nan'):10.4f}s {error or ''}", file=sys.stderr)
+    return result
+
+
+def _drain(reader: LocalReader) -> int:
+    with reader.read() as f:
+        return len(f.read())
+
+
+def _parse(formatter, path: str) -> int:
+    with LocalReader(path).read() as f:
+        return sum(len(df) for df in formatter.parse_frames(f))
+
+
+def _parse_records(formatter, path: str) -> int:
+    with LocalReader(path).read() as f:
+        return len(formatter.parse(f))
+
+
+def _reader_benchmarks(paths: Dict[str, str], sizes: Dict[str, int], repeat: int) -> List[Dict]:
+    path = paths["city.csv"]
+    return [
+        measure("reader.local", lambda: _drain(LocalReader(path)), 0, sizes["city.csv"], repeat),
+        measure("reader.local_mmap", lambda: _drain(LocalReader(path, use_mmap=True)), 0, sizes["city.csv"], repeat),
+    ]
+
+
+def _formatter_benchmarks(paths: Dict[str, str], sizes: Dict[str, int], rows: Dict[str, int], repeat: int) -> List[Dict]:
+    results = []
+    for table_name in ("country", "city"):
+        csv_path, parquet_path = paths[f"{table_name}.csv"], paths[f"{table_name}.parquet"]
+        n = rows[table_name]
+        results += [
+            measure(f"formatter.csv.parse.{table_name}", lambda: _parse_records(CSVFormatter(), csv_path), n, sizes[f"{table_name}.csv"], repeat),
+            measure(f"formatter.csv.parse_frames.{table_name}", lambda: _parse(CSVFormatter(), csv_path), n, sizes[f"{table_name}.csv"], repeat),
+            measure(
+                f"formatter.csv.parse_frames_chunked.{table_name}",
+                lambda: _parse(CSVFormatter(chunk_size=50_000), csv_path),
+                n,
+                sizes[f"{table_name}.csv"],
+                repeat,
+            ),
+            measure(f"formatter.parquet.parse.{table_name}", lambda: _parse_records(ParquetFormatter(), parquet_path), n, sizes[f"{table_name}.parquet"], repeat),
+            measure(f"formatter.parquet.parse_frames.{table_name}", lambda: _parse(ParquetFormatter(), parquet_path), n, sizes[f"{table_name}.parquet"], repeat),
+        ]
+    return results
+
+
+def _engine_benchmarks(dataset: SyntheticDataset, frames: Dict[str, pd.DataFrame], repeat: int, use_mysql: bool) -> List[Dict]:
+    schemas = {table_name: dataset.table_schema(table_name) for table_name in dataset.tables}
+    prefix = "engine.mysql" if use_mysql else "engine.stand_in"
+
+    def engine(**options):
+        if use_mysql:
+            return DBFactory.get_engine(OperationTarget("mysql", BENCH_DB_NAME, None), **options)
+        return StandInEngine(schemas, **options)
+
+    def write(operation: str, table_name: str, **options):
+        def run():
+            with engine(local_infile=options.get("method") == InsertMethod.LOAD_DATA) as db:
+                getattr(db, operation)(table_name, frames[table_name], **options)
+                db.commit()
+
+        return run
+
+    def truncate(table_name: str):
+        if not use_mysql:
+            return None
+
+        def run():
+            with engine() as db:
+                db.truncate(table_name)
+                db.commit()
+
+        return run
+
+    results = []
+    for table_name in ("country", "city"):
+        n = len(frames[table_name])
+        results += [
+            measure(f"{prefix}.insert.{table_name}", write("insert", table_name), n, 0, repeat, setup=truncate(table_name)),
+            measure(
+                f"{prefix}.insert_load_data.{table_name}",
+                write("insert", table_name, method=InsertMethod.LOAD_DATA),
+                n,
+                0,
+                repeat,
+                setup=truncate(table_name),
+            ),
+            measure(f"{prefix}.upsert.{table_name}", write("upsert", table_name), n, 0, repeat),
+            measure(f"{prefix}.upsert_via_staging.{table_name}", write("upsert_via_staging", table_name), n, 0, repeat),
+            measure(f"{prefix}.delete.{table_name}", write("delete", table_name), n, 0, repeat, setup=write("upsert", table_name) if use_mysql else None),
+        ]
+    return results
+
+
+def _end_to_end_benchmarks(
+    dataset: SyntheticDataset, paths: Dict[str, str], sizes: Dict[str, int], rows: Dict[str, int], repeat: int, use_mysql: bool
+) -> List[Dict]:
+    schemas = {table_name: dataset.table_schema(table_name) for table_name in dataset.tables}
+    prefix = "e2e.mysql" if use_mysql else "e2e.stand_in"
+
+    def run_task(table_name: str, extension: str, cache: Optional[ParsedSourceCache] = None, **options):
+        formatter = CSVFormatter(chunk_size=50_000) if extension == "csv" else ParquetFormatter()
+
+        def run():
+            DMLTask(
+                target=OperationTarget("mysql", BENCH_DB_NAME, table_name),
+                operaton=OperationType.RELOAD,
+                source=DataSrc(LocalReader(paths[f"{table_name}.{extension}"]), formatter, cache=cache),
+                **options,
+            ).run()
+
+        return run
+
+    engine_patch = (
+        nullcontext()
+        if use_mysql
+        else patch.object(DBFactory, "get_engine", lambda target, **options: StandInEngine(schemas, **options))
+    )
+    results = []
+    with engine_patch:
+        for table_name in ("country", "city"):
+            n = rows[table_name]
+            for extension in ("csv", "parquet"):
+                key = f"{table_name}.{extension}"
+                results += [
+                    measure(f"{prefix}.reload.{key}", run_task(table_name, extension), n, sizes[key], repeat),
+                    measure(f"{prefix}.reload_pipelined.{key}", run_task(table_name, extension, pipelined=True), n, sizes[key], repeat),
+                    measure(
+                        f"{prefix}.reload_load_data.{key}",
+                        run_task(table_name, extension, insert_method=InsertMethod.LOAD_DATA),
+                        n,
+                        sizes[key],
+                        repeat,
+                    ),
+                    # 1回目でキャッシュを作成するため、bestはキャッシュから読み込んだ場合の値となる
+                    measure(
+                        f"{prefix}.reload_parsed_cache.{key}",
+                        run_task(table_name, extension, cache=ParsedSourceCache(os.path.join(os.path.dirname(paths[key]), "cache"))),
+                        n,
+                        sizes[key],
+                        max(repeat, 2),
+                    ),
+                ]
+    return results
+
+
+def _metadata(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": {
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "pymysql": pymysql.__version__,
+            "fastparquet": fastparquet.__version__,
+        },
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="cityの行数")
+    parser.add_argument("--width", type=int, default=16, help="文字列カラムの値の長さ")
+    parser.add_argument("--null-ratio", type=float, default=0.1, help="空の値の割合")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mysql", action="store_true", help=f"config.tomlのMySQLの{BENCH_DB_NAME}データベースに対して計測する")
+    parser.add_argument("--only", default=None, help="reader, formatter, engine, e2eのいずれかのみ計測する")
+    parser.add_argument("--output", default=None, help="結果の出力先。省略時は標準出力")
+    args = parser.parse_args(argv)
+
+    # 計測中のログ出力を抑止する
+    logging.disable(logging.INFO)
+
+    dataset = SyntheticDataset(args.rows, width=args.width, null_ratio=args.null_ratio, seed=args.seed)
+    frames = {table_name: dataset.frame(table_name) for table_name in dataset.tables}
+    rows = {table_name: len(df) for table_name, df in frames.items()}
+    if args.mysql:
+        DDLTask(OperationTarget("mysql", None, None)).run(
+            [
+                f"DROP DATABASE IF EXISTS {BENCH_DB_NAME}",
+                f"CREATE DATABASE {BENCH_DB_NAME}",
+                f"USE {BENCH_DB_NAME}",
+                "SET GLOBAL local_infile = 1",
+            ]
+            + [dataset.ddl(table_name) for table_name in dataset.tables]
+        )
+
+    results: List[Dict] = []
+    with tempfile.TemporaryDirectory() as directory:
+        paths = dataset.write(directory)
+        sizes = {key: os.path.getsize(path) for key, path in paths.items()}
+        if args.only in (None, "reader"):
+            results += _reader_benchmarks(paths, sizes, args.repeat)
+        if args.only in (None, "formatter"):
+            results += _formatter_benchmarks(paths, sizes, rows, args.repeat)
+        if args.only in (None, "engine"):
+            results += _engine_benchmarks(dataset, frames, args.repeat, args.mysql)
+        if args.only in (None, "e2e"):
+            results += _end_to_end_benchmarks(dataset, paths, sizes, rows, args.repeat, args.mysql)
+
+    report = json.dumps({"meta": _metadata(args), "results": results}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
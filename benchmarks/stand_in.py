@@ -0,0 +1,86 @@
+from typing import Dict
+
+import pymysql
+
+from tasks.engines.mysql import MySQLEngine
+from tasks.engines.pool import ConnectionPool
+from tasks.models.model import TableSchema
+
+
+class StandInCursor:
+    """SQLを組み立てて破棄するカーソル。影響行数は組み立てたSQLから数える"""
+
+    def __init__(self, connection: "StandInConnection"):
+        self.connection = connection
+        self._result = None
+
+    def mogrify(self, query, args=None):
+        if args is None:
+            return query
+        return query % tuple(pymysql.converters.escape_item(a, "utf8mb4") for a in args)
+
+    def execute(self, query, args=None):
+        if isinstance(query, str) and "@@max_allowed_packet" in query:
+            self._result = {"max_allowed_packet": self.connection.max_allowed_packet}
+            return 1
+        self.connection.sent_bytes += len(query)
+        if isinstance(query, str) and "LOAD DATA" in query:
+            with open(args[0], "rb") as f:
+                return sum(1 for _ in f)
+        if isinstance(query, bytes):
+            return query.count(b"),(") + 1
+        return 0
+
+    def fetchone(self):
+        return self._result
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class StandInConnection:
+    """MySQLサーバの代わりに、送信されるSQLのバイト数のみを記録する接続"""
+
+    encoding = "utf8"
+    open = True
+
+    def __init__(self, max_allowed_packet: int = 64 * 1024 * 1024):
+        self.max_allowed_packet = max_allowed_packet
+        self.sent_bytes = 0
+
+    def cursor(self, cursor_class=None):
+        return StandInCursor(self)
+
+    def show_warnings(self):
+        return ()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+class StandInEngine(MySQLEngine):
+    """
+    MySQLサーバなしでMySQLEngineの書き込み経路(値の変換・SQLの組み立て・分割)を計測するためのエンジン
+
+    テーブルスキーマはinformation_schemaの代わりにschemasから取得する
+    """
+
+    def __init__(self, schemas: Dict[str, TableSchema], **options):
+        super().__init__("bench", access_info={}, **options)  # type: ignore
+        self.schemas = schemas
+        self.pool = ConnectionPool(StandInConnection)
+
+    def get_table_schema(self, table_name: str) -> TableSchema:
+        return self.schemas[table_name]
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# pymysql・boto3はブロッキングI/Oのため、全てのイベントループで共有する固定数のスレッドで実行する
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_max_workers = 16
+
+
+def set_max_workers(max_workers: int):
+    """ブロッキングI/Oを実行するスレッド数を設定する。次にスレッドプールを生成する時点から有効になる"""
+    global _executor, _max_workers
+    if max_workers < 1:
+        raise ValueError("max_workers must be a positive integer.")
+    with _executor_lock:
+        _max_workers = max_workers
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix="aio")
+        return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """ブロッキングな関数を共有スレッドプールで実行し、完了を待つ"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+
+
+async def iterate_blocking(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """ブロッキングなイテレータを、要素ごとに共有スレッドプールで進める"""
+    sentinel = object()
+    while True:
+        item = await run_blocking(next, iterator, sentinel)
+        if item is sentinel:
+            return
+        yield item  # type: ignore
+
+
+class AsyncDBEngine:
+    """
+    DBエンジンをasyncioから利用するためのラッパー
+
+    接続の取得・返却とメソッド呼び出しを共有スレッドプールで実行する
+    例: async with AsyncDBEngine(engine) as db: await db.insert(table_name, data)
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def __aenter__(self):
+        await run_blocking(self.engine.__enter__)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return await run_blocking(self.engine.__exit__, exc_type, exc_value, traceback)
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        method = getattr(self.engine, name)
+
+        async def wrapper(*args, **kwargs):
+            return await run_blocking(method, *args, **kwargs)
+
+        return wrapper
+
+
+async def run_tasks_async(tasks: Iterable, max_concurrency: int = 8) -> List[Any]:
+    """タスクのrun_asyncを、同時実行数をmax_concurrencyまでに制限して並行に実行する"""
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be a positive integer.")
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return await asyncio.gather(*(task.run_async(semaphore) for task in tasks))
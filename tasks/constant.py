@@ -1,3 +1,5 @@
+from pymysql.constants import FIELD_TYPE
+
 
 class MySQLConstant:
     string_types = (
@@ -33,4 +35,47 @@ class MySQLConstant:
         "newdate",
         "time",
         "timestamp",
-    )
\ No newline at end of file
+    )
+
+    # information_schema.COLUMNS.DATA_TYPE から、結果セットのカラム情報で通知される型コードへの対応
+    # テキスト型・BLOB型は結果セット上では全てBLOBとして通知される
+    information_schema_type_codes = {
+        "tinyint": FIELD_TYPE.TINY,
+        "smallint": FIELD_TYPE.SHORT,
+        "mediumint": FIELD_TYPE.INT24,
+        "int": FIELD_TYPE.LONG,
+        "bigint": FIELD_TYPE.LONGLONG,
+        "decimal": FIELD_TYPE.NEWDECIMAL,
+        "float": FIELD_TYPE.FLOAT,
+        "double": FIELD_TYPE.DOUBLE,
+        "bit": FIELD_TYPE.BIT,
+        "char": FIELD_TYPE.STRING,
+        "binary": FIELD_TYPE.STRING,
+        "enum": FIELD_TYPE.STRING,
+        "set": FIELD_TYPE.STRING,
+        "varchar": FIELD_TYPE.VAR_STRING,
+        "varbinary": FIELD_TYPE.VAR_STRING,
+        "tinytext": FIELD_TYPE.BLOB,
+        "text": FIELD_TYPE.BLOB,
+        "mediumtext": FIELD_TYPE.BLOB,
+        "longtext": FIELD_TYPE.BLOB,
+        "tinyblob": FIELD_TYPE.BLOB,
+        "blob": FIELD_TYPE.BLOB,
+        "mediumblob": FIELD_TYPE.BLOB,
+        "longblob": FIELD_TYPE.BLOB,
+        "date": FIELD_TYPE.DATE,
+        "datetime": FIELD_TYPE.DATETIME,
+        "timestamp": FIELD_TYPE.TIMESTAMP,
+        "time": FIELD_TYPE.TIME,
+        "year": FIELD_TYPE.YEAR,
+        "json": FIELD_TYPE.JSON,
+        "geometry": FIELD_TYPE.GEOMETRY,
+        "point": FIELD_TYPE.GEOMETRY,
+        "linestring": FIELD_TYPE.GEOMETRY,
+        "polygon": FIELD_TYPE.GEOMETRY,
+        "multipoint": FIELD_TYPE.GEOMETRY,
+        "multilinestring": FIELD_TYPE.GEOMETRY,
+        "multipolygon": FIELD_TYPE.GEOMETRY,
+        "geometrycollection": FIELD_TYPE.GEOMETRY,
+        "geomcollection": FIELD_TYPE.GEOMETRY,
+    }
@@ -1,17 +1,70 @@
+from __future__ import annotations
+
 from abc import abstractmethod, ABCMeta
 import csv
-from typing import Optional, Union, BinaryIO, Hashable, Any
-
-import pandas as pd
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, AsyncIterator, BinaryIO, Dict, Hashable, Iterable, Iterator, Optional, Sequence, Union
 
+from tasks.aio import iterate_blocking
 from utils.logger import get_logger
+from utils.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import fastparquet
+else:
+    pd = lazy_import("pandas")
+    fastparquet = lazy_import("fastparquet")
 
 
 class FormatterInterface(metaclass=ABCMeta):
+    # parse_framesのcolumnsで、指定カラム以外の読み込みを省略する場合はTrue
+    projects_columns = False
+
     @abstractmethod
     def parse(self, bytes_input: BinaryIO, *args, **kwargs):
         raise NotImplementedError()
 
+    def parse_batches(self, bytes_input: BinaryIO) -> Iterator[list[dict[Hashable, Any]]]:
+        """データを行のバッチ単位で返す。既定では全行を1つのバッチとして返す"""
+        yield self.parse(bytes_input)
+
+    def cache_settings(self) -> Optional[Dict[str, Any]]:
+        """パース結果に影響する設定を返す。パース結果をキャッシュできない場合はNone"""
+        return None
+
+    def parse_frames(
+        self,
+        bytes_input: BinaryIO,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """データを列形式(DataFrame)のバッチ単位で返す。既定ではparseの結果を1つのDataFrameとして返す
+
+        columns: 必要なカラム名。フォーマッタが対応している場合、それ以外のカラムの読み込みを省略する
+        """
+        yield pd.DataFrame.from_records(self.parse(bytes_input))
+
+    def parse_parts(
+        self,
+        parts: Iterable[BinaryIO],
+        columns: Optional[Sequence[str]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """複数のオブジェクトを順にparse_framesでパースし、1つのバッチ列として返す
+        パースし終えたオブジェクトはその時点で閉じる
+        """
+        for part in parts:
+            with part:
+                yield from self.parse_frames(part, columns=columns)
+
+    async def parse_frames_async(
+        self,
+        bytes_input: BinaryIO,
+        columns: Optional[Sequence[str]] = None,
+    ) -> AsyncIterator[pd.DataFrame]:
+        """parse_framesをasyncioから呼び出す。既定ではバッチごとに共有スレッドプールでパースする"""
+        async for df in iterate_blocking(self.parse_frames(bytes_input, columns=columns)):
+            yield df
+
 
 class CSVFormatter(FormatterInterface):
     """
@@ -21,6 +74,7 @@ class CSVFormatter(FormatterInterface):
     has_header = False: 全行をパース。必ずcolumn_namesを指定する必要がある
     column_namesが指定された場合、指定カラム名を使用
     column_namesが指定されなかった場合、1行目をヘッダとして使用
+    chunk_sizeが指定された場合、parse_batchesはchunk_size行ずつデータを返す
     """
 
     def __init__(
@@ -28,12 +82,23 @@ class CSVFormatter(FormatterInterface):
         encoding: str = "utf-8",
         has_header: Optional[bool] = None,
         column_names: Union[list, tuple, None] = None,
+        chunk_size: Optional[int] = None,
     ):
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError("chunk_size must be a positive integer.")
         self.has_header = has_header
         self.column_names = column_names
         self.encoding = encoding
+        self.chunk_size = chunk_size
         self.logger = get_logger(__name__)
 
+    def cache_settings(self) -> Optional[Dict[str, Any]]:
+        """chunk_sizeはバッチの区切りのみに影響するため含めない"""
+        return {
+            "encoding": self.encoding,
+            "has_header": self.has_header,
+            "column_names": list(self.column_names) if self.column_names is not None else None,
+        }
 
     def infer_has_header(self, csv_string: str):
         sniffer = csv.Sniffer()
@@ -44,49 +109,128 @@ class CSVFormatter(FormatterInterface):
         self,
         bytes_input: BinaryIO,
     ) -> list[dict[Hashable, Any]]:
-        if self.has_header is None:
-            head = bytes_input.read(10_000).decode(encoding=self.encoding)
-            self.has_header = self.infer_has_header(head)
-            bytes_input.seek(0)
+        res = []
+        for df in self._read_frames(bytes_input):
+            res.extend(df.to_dict("records"))
+        return res
 
-        self.logger.info(f"take it as csv. (encoding: {self.encoding}, has_header: {self.has_header})")
-        if self.has_header is False:
+    def parse_batches(
+        self,
+        bytes_input: BinaryIO,
+    ) -> Iterator[list[dict[Hashable, Any]]]:
+        """chunk_size行ずつデータを返す。chunk_size未指定の場合は全行を1つのバッチとして返す"""
+        for df in self.parse_frames(bytes_input):
+            yield df.to_dict("records")
+
+    def parse_frames(
+        self,
+        bytes_input: BinaryIO,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """chunk_size行ずつのDataFrameを返す。chunk_size未指定の場合は全行を1つのDataFrameとして返す
+        全ての値が空の行の判定を変えないよう、columnsは使用せず全カラムを読み込む
+        """
+        for df in self._read_frames(bytes_input):
+            if len(df) == 0:
+                continue
+            yield df
+
+    def _read_frames(self, bytes_input: BinaryIO) -> Iterator[pd.DataFrame]:
+        # 推定したhas_headerはこのパースでのみ使用し、設定(cache_settings)は変更しない
+        has_header = self.has_header
+        if has_header is None:
+            head = self._peek_head(bytes_input).decode(encoding=self.encoding, errors="ignore")
+            has_header = self.infer_has_header(head)
+
+        self.logger.info(
+            f"take it as csv. (encoding: {self.encoding}, has_header: {has_header}, chunk_size: {self.chunk_size})"
+        )
+        if has_header is False:
             # ヘッダなしファイルの場合は指定されたカラム名を使用
             if self.column_names is None:
                 raise ValueError("column_names must be specified when has_header=False. If you want to use the first row as a header, set has_header=True.")
-            df = pd.read_csv(
-                bytes_input,
-                dtype="str",
-                names=self.column_names,
-                header=None,
-                encoding=self.encoding,
-            )
+            read_options = dict(names=self.column_names, header=None)
         else:
             # ヘッダありファイルの場合は先頭行をカラム名として使用
             # 指定があった場合は指定カラムを代わりに使用
-            df = pd.read_csv(bytes_input, dtype="str", encoding=self.encoding)
-            if self.column_names:
-                df.columns = self.column_names
+            read_options = dict()
+
+        if self.chunk_size is None:
+            df = pd.read_csv(bytes_input, dtype="str", encoding=self.encoding, **read_options)
+            yield self._normalize(df, has_header)
+            return
+
+        with pd.read_csv(
+            bytes_input,
+            dtype="str",
+            encoding=self.encoding,
+            chunksize=self.chunk_size,
+            **read_options,
+        ) as reader:
+            for df in reader:
+                yield self._normalize(df, has_header)
+
+    @staticmethod
+    def _peek_head(bytes_input: BinaryIO, size: int = 10_000) -> bytes:
+        """読み込み位置を進めずに先頭バイト列を取得する
+        seekできないストリームの場合はバッファ済みの範囲のみを返す
+        """
+        if bytes_input.seekable():
+            head = bytes_input.read(size)
+            bytes_input.seek(0)
+            return head
+        return bytes_input.peek(size)[:size]  # type: ignore
+
+    def _normalize(self, df: pd.DataFrame, has_header: bool) -> pd.DataFrame:
+        if has_header and self.column_names:
+            df.columns = self.column_names
         df.dropna(how="all", inplace=True)  # 全ての値が空の行を削除
         df = df.fillna("")  # NaNを空文字に置換
-        res = df.to_dict("records")
-        return res
+        return df
 
 
 class ParquetFormatter(FormatterInterface):
     """
     バイト列をParquetの形式として解釈し、データを取得
+
+    parse_framesは行グループ単位でデータを返す
+    columnsが指定された場合、ファイルに存在するカラムのうち指定カラムのみを読み込む
     """
 
+    projects_columns = True
+
     def __init__(
         self,
     ):
         self.logger = get_logger(__name__)
 
+    def cache_settings(self) -> Optional[Dict[str, Any]]:
+        return {}
+
     def parse(self, bytes_input: BinaryIO):
-        self.logger.info("take it as parquet.")
+        res = []
+        for df in self.parse_frames(bytes_input):
+            res.extend(df.to_dict("records"))
+        return res
 
-        df = pd.read_parquet(bytes_input)
-        df = df.fillna("")  # NaNを空文字に置換
-        res = df.to_dict("records")
-        return res
\ No newline at end of file
+    def parse_frames(
+        self,
+        bytes_input: BinaryIO,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        if not bytes_input.seekable():
+            # Parquetはフッタから読むためseek可能である必要がある
+            bytes_input = BytesIO(bytes_input.read())
+        pf = fastparquet.ParquetFile(bytes_input)
+        if columns is not None:
+            # ファイルに存在しないカラムは読み込めないため除外する。欠けたカラムの検出は書き込み側で行う
+            columns = [c for c in columns if c in pf.columns]
+        self.logger.info(
+            f"take it as parquet. (row_groups: {len(pf.row_groups)}, columns: {'all' if columns is None else len(columns)}/{len(pf.columns)})"
+        )
+
+        for df in pf.iter_row_groups(columns=columns):
+            if len(df) == 0:
+                continue
+            df = df.fillna("")  # NaNを空文字に置換
+            yield df
@@ -1,11 +1,37 @@
+from __future__ import annotations
+
 from abc import abstractmethod, ABCMeta
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from fnmatch import fnmatchcase
+import bz2
+import gzip
+import mmap
+import os
 from pathlib import Path
-import boto3
 from urllib.parse import urlsplit
-from typing import BinaryIO
-from io import BytesIO
+from typing import TYPE_CHECKING, BinaryIO, Callable, Deque, Iterator, List, Optional
+from io import BytesIO, BufferedReader, RawIOBase, SEEK_SET, SEEK_CUR, SEEK_END
 
+from tasks.aio import run_blocking
+from tasks.s3_cache import S3ObjectCache
 from utils.logger import get_logger
+from utils.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import boto3
+    import zstandard
+else:
+    boto3 = lazy_import("boto3")
+    zstandard = lazy_import("zstandard")
+
+# 圧縮形式ごとの拡張子と先頭のマジックバイト
+COMPRESSIONS = {
+    "gzip": ((".gz", ".gzip"), b"\x1f\x8b"),
+    "bz2": ((".bz2",), b"BZh"),
+    "zstd": ((".zst", ".zstd"), b"\x28\xb5\x2f\xfd"),
+}
+DECOMPRESS_BUFFER_SIZE = 1024 * 1024
 
 
 class ReaderInterface(metaclass=ABCMeta):
@@ -13,38 +39,129 @@ class ReaderInterface(metaclass=ABCMeta):
     def read(self):
         raise NotImplementedError()
 
+    async def read_async(self) -> BinaryIO:
+        """readをasyncioから呼び出す。既定では共有スレッドプールでreadを実行する"""
+        return await run_blocking(self.read)
+
+    def fingerprint(self) -> Optional[str]:
+        """読み込まずに、内容が変わると変わる識別子を返す。求められない場合はNone"""
+        return None
+
 
 class LocalReader(ReaderInterface):
-    def __init__(self, path: str):
+    """
+    ローカルファイルを読み込む
+
+    use_mmap = False: ファイル全体をメモリにコピーしてから返す
+    use_mmap = True: ファイルをメモリマップし、コピーせずに読み出すファイルライクオブジェクトを返す
+    いずれの場合も、返却したオブジェクトは利用後にcloseすること
+    compression: 圧縮形式(decompress_streamを参照)。圧縮されている場合は展開しながら読み出す
+    """
+
+    def __init__(self, path: str, use_mmap: bool = False, compression: Optional[str] = "infer"):
+        _validate_compression(compression)
         self.logger = get_logger(__name__)
         self.path = path
+        self.use_mmap = use_mmap
+        self.compression = compression
 
     def read(self) -> BinaryIO:
         self.logger.info(f"read binary from {self.path}")
         path = Path(self.path)
         assert path.exists(), f"指定ファイルが存在しません: {path}"
+        if self.use_mmap:
+            return decompress_stream(_MmapIO(path), self.compression, name=self.path)  # type: ignore
         with path.open("rb") as fb:
             res = BytesIO(fb.read())
-        return res
+        return decompress_stream(res, self.compression, name=self.path)
+
+    def fingerprint(self) -> Optional[str]:
+        """絶対パス・サイズ・更新時刻から求める"""
+        stat = os.stat(self.path)
+        return f"file://{os.path.abspath(self.path)}:{stat.st_size}:{stat.st_mtime_ns}:{self.compression}"
 
 
 class AWSS3Reader(ReaderInterface):
-    def __init__(self, s3_uri: str):
+    """
+    S3オブジェクトを読み込む
+
+    streaming = False, max_workers = 1: オブジェクト全体をメモリに読み込んでから返す
+    streaming = True: レスポンスボディをそのままファイルライクオブジェクトとして返す
+    max_workers > 1: part_sizeごとのバイト範囲をスレッドプールで並列に取得しながら返す
+    ストリーミング時はseekできないため、必要に応じてフォーマッタ側でバッファする
+    compression: 圧縮形式(decompress_streamを参照)。圧縮されている場合は取得したバイト列を展開しながら読み出す
+    cache: 指定した場合、オブジェクトをS3ObjectCacheに格納し、ローカルファイルとして(メモリマップで)読み込む
+           streaming, max_workers, part_sizeは使用しない
+    """
+
+    def __init__(
+        self,
+        s3_uri: str,
+        streaming: bool = False,
+        max_workers: int = 1,
+        part_size: int = 8 * 1024 * 1024,
+        compression: Optional[str] = "infer",
+        cache: Optional[S3ObjectCache] = None,
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive integer.")
+        if part_size < 1:
+            raise ValueError("part_size must be a positive integer.")
+        _validate_compression(compression)
         self.logger = get_logger(__name__)
         self.uri = s3_uri
+        self.streaming = streaming
+        self.max_workers = max_workers
+        self.part_size = part_size
+        self.compression = compression
+        self.cache = cache
 
-    def read(self) -> BytesIO:
+    def read(self) -> BinaryIO:
         self.logger.info(f"read binary from {self.uri}")
         bucket_name, prefix = self._parse_s3_uri(self.uri)
         self.s3 = boto3.resource("s3")
         self.bucket = self.s3.Bucket(bucket_name)  # type: ignore
         self.prefix = prefix
+        client = self.s3.meta.client  # type: ignore
+
+        if self.cache is not None:
+            path = self.cache.fetch(client, bucket_name, prefix)
+            # キャッシュファイルには拡張子がないため、キーの拡張子から判定する
+            compression = self.compression
+            if compression in ("infer", "sniff"):
+                compression = _compression_from_name(prefix) or (None if compression == "infer" else "sniff")
+            return LocalReader(str(path), use_mmap=True, compression=compression).read()
+
+        if self.max_workers > 1:
+            head = client.head_object(Bucket=bucket_name, Key=prefix)
+            self.logger.info(
+                f"ranged download. (size: {head['ContentLength']}, part_size: {self.part_size}, max_workers: {self.max_workers})"
+            )
+            raw = _S3RangedIO(
+                client,
+                bucket_name,
+                prefix,
+                size=head["ContentLength"],
+                etag=head["ETag"],
+                part_size=self.part_size,
+                max_workers=self.max_workers,
+            )
+            return decompress_stream(BufferedReader(raw, buffer_size=self.part_size), self.compression, name=prefix)
 
-        obj = self.s3.meta.client.get_object(Bucket=bucket_name, Key=prefix)  # type: ignore
+        obj = client.get_object(Bucket=bucket_name, Key=prefix)
+        if self.streaming:
+            return decompress_stream(BufferedReader(_S3BodyIO(obj["Body"]), buffer_size=self.part_size), self.compression, name=prefix)
         content = BytesIO(obj["Body"].read())
-        return content
+        return decompress_stream(content, self.compression, name=prefix)
 
-    def _parse_s3_uri(self, s3_uri: str):
+    def fingerprint(self) -> Optional[str]:
+        """オブジェクトの現在のETagから求める"""
+        bucket_name, key = self._parse_s3_uri(self.uri)
+        etag = boto3.client("s3").head_object(Bucket=bucket_name, Key=key)["ETag"]
+        return f"{self.uri}:{etag}:{self.compression}"
+
+    @staticmethod
+    def _parse_s3_uri(s3_uri: str):
         """S3 URI(s3://bucket/key)からバケット名とプレフィクスを取得"""
 
         parsed_url = urlsplit(s3_uri)
@@ -54,3 +171,341 @@ class AWSS3Reader(ReaderInterface):
         bucket_name = parsed_url.netloc
         key = parsed_url.path.lstrip("/")
         return bucket_name, key
+
+
+class AWSS3PrefixReader(ReaderInterface):
+    """
+    S3のプレフィクス(s3://bucket/exports/)またはglob(s3://bucket/exports/part-*.csv)に一致する
+    複数のオブジェクトを、max_workers個のスレッドで並列に取得しながら読み込む
+
+    readはMultiObjectSourceを返し、フォーマッタはオブジェクトごとにパースして1つのバッチ列として扱う
+    ordered = True: キーの辞書順に返す
+    ordered = False: 取得が完了した順に返す
+    メモリに保持する取得済み・取得中のオブジェクトはmax_workersの2倍までとする
+    compression: 圧縮形式(decompress_streamを参照)。オブジェクトは圧縮されたまま保持し、パース時に展開する
+    """
+
+    def __init__(self, s3_uri: str, max_workers: int = 8, ordered: bool = True, compression: Optional[str] = "infer"):
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive integer.")
+        _validate_compression(compression)
+        self.logger = get_logger(__name__)
+        self.uri = s3_uri
+        self.max_workers = max_workers
+        self.ordered = ordered
+        self.compression = compression
+
+    def read(self) -> MultiObjectSource:
+        bucket_name, pattern = AWSS3Reader._parse_s3_uri(self.uri)
+        client = boto3.client("s3")
+        keys = self._list_keys(client, bucket_name, pattern)
+        if not keys:
+            raise FileNotFoundError(f"no object matches {self.uri}")
+        self.logger.info(f"read {len(keys)} objects from {self.uri} (max_workers: {self.max_workers}, ordered: {self.ordered})")
+
+        def fetch(key: str) -> BinaryIO:
+            content = BytesIO(client.get_object(Bucket=bucket_name, Key=key)["Body"].read())
+            return decompress_stream(content, self.compression, name=key)
+
+        return MultiObjectSource(keys, fetch, max_workers=self.max_workers, ordered=self.ordered)
+
+    @staticmethod
+    def _list_keys(client, bucket_name: str, pattern: str) -> List[str]:
+        """patternにglobの文字が含まれる場合はそれより前をプレフィクスとして一覧し、globに一致するキーを返す
+        含まれない場合はpatternをプレフィクスとする。ディレクトリを表す末尾が/のキーは除く
+        """
+        glob_start = min((i for i, c in enumerate(pattern) if c in "*?["), default=None)
+        prefix = pattern if glob_start is None else pattern[:glob_start]
+        keys = []
+        for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if key.endswith("/"):
+                    continue
+                if glob_start is None or fnmatchcase(key, pattern):
+                    keys.append(key)
+        return sorted(keys)
+
+
+class MultiObjectSource:
+    """
+    複数のオブジェクトを取得しながら順に返す、1つの論理的なソース
+
+    イテレーションするとオブジェクトごとのファイルライクオブジェクトを返す
+    取得はmax_workers個のスレッドで並列に行い、先読みはmax_workersの2倍までに制限する
+    利用後は必ずcloseすること(withで使用できる)
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        fetch: Callable[[str], BinaryIO],
+        max_workers: int = 8,
+        ordered: bool = True,
+        wrap: Optional[Callable[[BinaryIO], BinaryIO]] = None,
+    ):
+        self.keys = keys
+        self._fetch = fetch
+        self._max_workers = max_workers
+        self._ordered = ordered
+        self._wrap = wrap
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def map(self, wrap: Callable[[BinaryIO], BinaryIO]) -> MultiObjectSource:
+        """各オブジェクトをwrapで包んで返すソースを返す"""
+        return MultiObjectSource(self.keys, self._fetch, self._max_workers, self._ordered, wrap)
+
+    def __iter__(self) -> Iterator[BinaryIO]:
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="s3-prefix")
+        keys = deque(self.keys)
+        pending: Deque[Future] = deque()
+        try:
+            while keys or pending:
+                while keys and len(pending) < self._max_workers * 2:
+                    pending.append(self._executor.submit(self._fetch, keys.popleft()))
+                if self._ordered:
+                    future = pending.popleft()
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    future = done.pop()
+                    pending.remove(future)
+                part = future.result()
+                yield self._wrap(part) if self._wrap is not None else part
+        finally:
+            self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def decompress_stream(stream: BinaryIO, compression: Optional[str] = "infer", name: Optional[str] = None) -> BinaryIO:
+    """
+    圧縮されたストリームを、展開しながら読み出すファイルライクオブジェクトを返す
+    展開後のデータ全体をメモリに保持することはない。返却したオブジェクトをcloseすると元のストリームも閉じる
+
+    compression = "infer": nameの拡張子から圧縮形式を判定し、圧縮形式の拡張子でなければstreamをそのまま返す
+    compression = "sniff": nameの拡張子、なければ先頭のマジックバイトから圧縮形式を判定する
+                           非圧縮のデータが偶然マジックバイトで始まる場合も展開しようとするため、拡張子のない圧縮ファイルにのみ指定する
+    compression = None: 展開せずにstreamをそのまま返す
+    compression = "gzip" | "bz2" | "zstd": 指定した形式として展開する
+    """
+    _validate_compression(compression)
+    if compression == "infer":
+        compression = _compression_from_name(name) if name is not None else None
+    elif compression == "sniff":
+        compression = _infer_compression(stream, name)
+    if compression is None:
+        return stream
+
+    if compression == "gzip":
+        decompressed = gzip.GzipFile(fileobj=stream, mode="rb")
+    elif compression == "bz2":
+        decompressed = bz2.BZ2File(stream, mode="rb")
+    else:
+        decompressed = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True, closefd=False)
+    get_logger(__name__).info(f"decompress {name or 'stream'} as {compression}")
+    return BufferedReader(_DecompressedIO(decompressed, stream), buffer_size=DECOMPRESS_BUFFER_SIZE)  # type: ignore
+
+
+def _validate_compression(compression: Optional[str]):
+    if compression is not None and compression not in ("infer", "sniff") and compression not in COMPRESSIONS:
+        raise ValueError(f"unsupported compression: {compression}")
+
+
+def _infer_compression(stream: BinaryIO, name: Optional[str]) -> Optional[str]:
+    """拡張子、なければマジックバイトから圧縮形式を判定する。読み込み位置は進めない"""
+    compression = _compression_from_name(name) if name is not None else None
+    if compression is not None:
+        return compression
+
+    if stream.seekable():
+        position = stream.tell()
+        head = stream.read(4)
+        stream.seek(position)
+    elif hasattr(stream, "peek"):
+        head = stream.peek(4)[:4]  # type: ignore
+    else:
+        return None
+    for compression, (_, magic) in COMPRESSIONS.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def _compression_from_name(name: str) -> Optional[str]:
+    lower_name = name.lower()
+    for compression, (extensions, _) in COMPRESSIONS.items():
+        if lower_name.endswith(extensions):
+            return compression
+    return None
+
+
+class _DecompressedIO(RawIOBase):
+    """展開用のファイルライクオブジェクトをRawIOBaseとして扱い、close時に元のストリームも閉じるアダプタ"""
+
+    def __init__(self, decompressed: BinaryIO, source: BinaryIO):
+        self._decompressed = decompressed
+        self._source = source
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._decompressed.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._decompressed.close()
+            finally:
+                self._source.close()
+        super().close()
+
+
+class _MmapIO(RawIOBase):
+    """メモリマップしたファイルを、コピーせずに読み出すseek可能なアダプタ"""
+
+    def __init__(self, path: Path):
+        with path.open("rb") as fb:
+            # 空ファイルはmmapできないため、空のバッファとして扱う
+            if os.fstat(fb.fileno()).st_size == 0:
+                self._mmap = None
+                self._view = memoryview(b"")
+            else:
+                self._mmap = mmap.mmap(fb.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._mmap)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos : self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_SET:
+            pos = offset
+        elif whence == SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError(f"negative seek position: {pos}")
+        self._pos = pos
+        return pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        super().close()
+
+
+class _S3BodyIO(RawIOBase):
+    """botocoreのStreamingBodyをRawIOBaseとして扱うためのアダプタ"""
+
+    def __init__(self, body):
+        self._body = body
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._body.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._body.close()
+        super().close()
+
+
+class _S3RangedIO(RawIOBase):
+    """オブジェクトをバイト範囲ごとに並列取得し、先頭から順に読み出すアダプタ
+    先読みはmax_workersの2倍のパート数までに制限し、メモリ使用量を抑える
+    取得中にオブジェクトが更新された場合に備え、ETagが一致する場合のみ取得する
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket_name: str,
+        key: str,
+        size: int,
+        etag: str,
+        part_size: int,
+        max_workers: int,
+    ):
+        self._client = client
+        self._bucket_name = bucket_name
+        self._key = key
+        self._etag = etag
+        self._ranges = deque(
+            (start, min(start + part_size, size) - 1)
+            for start in range(0, size, part_size)
+        )
+        self._max_prefetch = max_workers * 2
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending: Deque[Future] = deque()
+        self._buffer = memoryview(b"")
+        self._submit()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            if not self._pending:
+                return 0
+            self._buffer = memoryview(self._pending.popleft().result())
+            self._submit()
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._pending.clear()
+            self._buffer = memoryview(b"")
+        super().close()
+
+    def _submit(self):
+        while self._ranges and len(self._pending) < self._max_prefetch:
+            start, end = self._ranges.popleft()
+            self._pending.append(self._executor.submit(self._fetch, start, end))
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        obj = self._client.get_object(
+            Bucket=self._bucket_name,
+            Key=self._key,
+            Range=f"bytes={start}-{end}",
+            IfMatch=self._etag,
+        )
+        return obj["Body"].read()
@@ -25,3 +25,7 @@ class DBEngineInterface(metaclass=ABCMeta):
     @abstractmethod
     def commit(self):
         raise NotImplementedError()
+
+    @abstractmethod
+    def invalidate_schema_cache(self, table_name=None):
+        raise NotImplementedError()
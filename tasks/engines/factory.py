@@ -3,8 +3,8 @@ from tasks.models.operation import OperationTarget
 
 class DBFactory:
     @staticmethod
-    def get_engine(db_engine: OperationTarget):
+    def get_engine(db_engine: OperationTarget, **engine_options):
         if db_engine.engine_option == "mysql":
-            return MySQLEngine(db_engine.db_name)
+            return MySQLEngine(db_engine.db_name, **engine_options)
         else:
             raise NotImplementedError()
@@ -1,37 +1,90 @@
+from __future__ import annotations
+
+import os
+import tempfile
 import time
+import uuid
+from contextlib import contextmanager
 
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 import pymysql
 from pymysql.cursors import DictCursor
 
-from utils.config import config, MySQLAccessInfo
+from utils.config import ConfigStructure, load_config, MySQLAccessInfo
 from utils.logger import get_logger
 from tasks.constant import MySQLConstant
 
-from tasks.models.model import TableSchema, ColumnSchema
+from tasks.models.model import TableSchema, ColumnSchema, RowEncoder
+from tasks.models.operation import InsertMethod
 from tasks.engines.abstract import DBEngineInterface
+from tasks.engines.pool import get_connection_pool
+from tasks.engines.schema_cache import TableSchemaCache
+from utils.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
 
+# プロセス内の全エンジンで共有するテーブルスキーマのキャッシュ
+schema_cache = TableSchemaCache(ttl=300)
+
+# MySQLのtype_codeから型名への対応
+_MYSQL_TYPE_NAMES = {
+    getattr(pymysql.FIELD_TYPE, k): k.lower()
+    for k in dir(pymysql.FIELD_TYPE)
+    if not k.startswith("_")
+}
 
 
 class MySQLEngine(DBEngineInterface):
-    def __init__(self, db_name: str, access_info: MySQLAccessInfo = config["mysql"]):
+    def __init__(
+        self,
+        db_name: str,
+        access_info: Optional[MySQLAccessInfo] = None,
+        local_infile: bool = False,
+        commit_per_chunk: bool = False,
+    ):
+        # 接続情報を省略した場合は設定ファイルのmysqlを使う。指定した場合は設定ファイルを省略できる
+        config: Optional[ConfigStructure]
+        if access_info is None:
+            config = load_config()
+            access_info = config["mysql"]
+        else:
+            config = load_config(optional=True)
+        # 接続プールの設定は設定ファイルのmysql_pool(省略可)を使う
+        pool_options = config.get("mysql_pool", {}) if config is not None else {}
         self.db_name = db_name
+        self.local_infile = local_infile
+        self.commit_per_chunk = commit_per_chunk
+        self._max_allowed_packet: Optional[int] = None
         self.logger = get_logger(__name__)
-        self.connection = pymysql.connect(
-            db=self.db_name,
-            charset="utf8mb4",
-            cursorclass=DictCursor,
-            **access_info
+        # 接続は接続情報・DB名ごとのプールから、withブロックの間だけ借りる
+        self.pool = get_connection_pool(
+            (tuple(sorted(access_info.items())), db_name, local_infile),
+            lambda: pymysql.connect(
+                db=db_name,
+                charset="utf8mb4",
+                cursorclass=DictCursor,
+                local_infile=local_infile,
+                **access_info
+            ),
+            **pool_options,
         )
-        self.last_ping_time = time.time()
+        self.connection = None
+        self._session_modified = False
 
     def __enter__(self):
-        self._ping()
+        assert self.connection is None, "MySQLEngine is already in use"
+        self.connection = self.pool.acquire()
+        self._session_modified = False
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.connection.close()
+        # 任意のSQLを実行した接続はUSEやSETでセッションの状態が変わりうるため、再利用せずに閉じる
+        self.pool.release(self.connection, discard=self._session_modified)
+        self.connection = None
 
     @staticmethod
     def rollback_on_fail(func):
@@ -55,43 +108,69 @@ class MySQLEngine(DBEngineInterface):
         return primary_key_names
 
     def get_table_schema(self, table_name: str) -> TableSchema:
-        """cursor.descriptionを使ってテーブルのスキーマを取得する
-        例:
-            (
-                ('id', 01, None, 11, None, None, True),
-                ('name', 02, None, 255, None, None, True),
-                ('email', 03, None, 255, None, None, False)
-            )
-        タプルの要素は以下の通り
-            0 name: カラム名
-            1 type_code: カラムのデータ型コード
-            2 display_size: カラムの表示幅
-            3 internal_size: カラムの内部的なサイズ
-            4 precision: カラムの桁数（数値型の場合）
-            5 scale: カラムの小数点以下の桁数（数値型の場合）
-            6 null_ok: カラムがNULL許容かどうかを示すフラグ
+        """information_schemaからテーブルのスキーマを取得する
+        カラム名・型・NULL許容・プライマリーキーかどうかを1回のクエリでまとめて取得し、
+        (DB名, テーブル名)単位でキャッシュする
+        型はcursor.descriptionのtype_codeと同じ表現に変換して保持する
         source: https://peps.python.org/pep-0249/#type-objects
         """
+        db_name, _, name = table_name.rpartition(".")
+        db_name = db_name or self.db_name
+        table_schema = schema_cache.get(db_name, name)
+        if table_schema is not None:
+            return table_schema
+
         cursor = self.connection.cursor()
-        # LIMIT 0を指定することで、実際にデータを取得せずにカラム情報のみを取得する
-        cursor.execute(f"SELECT * FROM {table_name} LIMIT 0")
+        cursor.execute(
+            """
+            SELECT COLUMN_NAME AS name, DATA_TYPE AS data_type, IS_NULLABLE AS is_nullable, COLUMN_KEY AS column_key
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = COALESCE(%s, DATABASE()) AND TABLE_NAME = %s
+            ORDER BY ORDINAL_POSITION
+            """,
+            (db_name, name),
+        )
+        res = cursor.fetchall()
+        if len(res) == 0:
+            raise pymysql.err.ProgrammingError(1146, f"Table '{table_name}' doesn't exist")
+
         column_schemas = [
             {
-                "name": d[0],
-                "data_type": d[1],
-                "is_nullable": d[6],
-                "is_primary_key": False,
+                "name": d["name"],
+                "data_type": MySQLConstant.information_schema_type_codes.get(d["data_type"].lower()),
+                "is_nullable": d["is_nullable"] == "YES",
+                "is_primary_key": d["column_key"] == "PRI",
             }
-            for d in cursor.description
+            for d in res
         ]
-        # プライマリーキーの情報を追加
-        for cs in column_schemas:
-            if cs["name"] in self.get_primary_key(table_name):
-                cs["is_primary_key"] = True
-
-        return TableSchema.from_dict(
+        table_schema = TableSchema.from_dict(
             {"table_name": table_name, "column_schemas": column_schemas}
         )
+        schema_cache.set(db_name, name, table_schema)
+        return table_schema
+
+    def get_foreign_keys(self) -> List[Tuple[str, str]]:
+        """接続先DBの外部キーを(参照元テーブル名, 参照先テーブル名)の組で取得する"""
+        cursor = self.connection.cursor()
+        cursor.execute(
+            """
+            SELECT DISTINCT TABLE_NAME AS table_name, REFERENCED_TABLE_NAME AS referenced_table_name
+            FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = COALESCE(%s, DATABASE())
+              AND REFERENCED_TABLE_SCHEMA = TABLE_SCHEMA
+              AND REFERENCED_TABLE_NAME IS NOT NULL
+            """,
+            (self.db_name,),
+        )
+        return [(d["table_name"], d["referenced_table_name"]) for d in cursor.fetchall()]
+
+    def invalidate_schema_cache(self, table_name: Optional[str] = None):
+        """テーブルスキーマのキャッシュを無効化する。テーブル名未指定の場合は全て無効化する"""
+        if table_name is None:
+            schema_cache.invalidate()
+            return
+        db_name, _, name = table_name.rpartition(".")
+        schema_cache.invalidate(db_name or self.db_name, name)
 
     def _repr_for_empty_value(self, column_schema: ColumnSchema):
         """挿入対象の値が空文字であるとき、
@@ -127,15 +206,29 @@ class MySQLEngine(DBEngineInterface):
     @staticmethod
     def get_mysql_type_name(type_code):
         """MySQLのtype_codeから型名を取得する"""
-        d = {
-            getattr(pymysql.FIELD_TYPE, k): k
-            for k in dir(pymysql.FIELD_TYPE)
-            if not k.startswith("_")
-        }
-        return d[type_code].lower()
+        return _MYSQL_TYPE_NAMES[type_code]
+
+    def get_row_encoder(self, table_schema: TableSchema) -> RowEncoder:
+        """テーブルの行データを挿入用の値リストに変換するエンコーダを取得する"""
+        return table_schema.compile_row_encoder(self._repr_for_empty_value)
+
+    def _encode_rows(self, table_schema: TableSchema, data: Union[List[Dict], pd.DataFrame]) -> List[Sequence]:
+        """挿入対象カラム順の値リストに変換する。DataFrameの場合は列単位で変換する"""
+        start = time.perf_counter()
+        encoder = self.get_row_encoder(table_schema)
+        if isinstance(data, pd.DataFrame):
+            values = encoder.encode_frame(data)
+        else:
+            values = encoder.encode_rows(data)
+        elapsed = time.perf_counter() - start
+        self.logger.debug(
+            f"encoded {len(values)} rows in {elapsed:.3f}s ({len(values) / max(elapsed, 1e-9):.0f} rows/s)"
+        )
+        return values
 
     @rollback_on_fail
     def execute(self, query):
+        self._session_modified = True
         cursor = self.connection.cursor()
         affected_rows = cursor.execute(query)
         res = cursor.fetchall()
@@ -145,7 +238,7 @@ class MySQLEngine(DBEngineInterface):
     def _escape(value):
         return pymysql.converters.escape_string(value)
 
-    def validate_affected_count(self, affected_cnt: Optional[int], data: List[Dict]):
+    def validate_affected_count(self, affected_cnt: Optional[int], data: Union[List[Dict], pd.DataFrame]):
         match affected_cnt:
             case None:
                 if len(data) != 0:
@@ -160,37 +253,155 @@ class MySQLEngine(DBEngineInterface):
                         f"expected: {len(data)}, actual: {affected_cnt}"
                     )
 
+    def get_max_allowed_packet(self) -> int:
+        """サーバのmax_allowed_packetを取得する"""
+        if self._max_allowed_packet is None:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT @@max_allowed_packet AS max_allowed_packet")
+            self._max_allowed_packet = int(cursor.fetchone()["max_allowed_packet"])
+        return self._max_allowed_packet
+
+    def _execute_values(
+        self,
+        cursor,
+        sql: str,
+        row_template: str,
+        values: Iterable[Sequence],
+        max_rows: Optional[int] = None,
+    ) -> int:
+        """sql中のrow_template(VALUES句の1行分)を複数行に展開して実行する
+        エスケープ後のバイト数がmax_allowed_packetを超えないよう(max_rowsを指定した場合は行数もそれ以下となるよう)文を分割し、
+        commit_per_chunkが有効な場合は分割した文ごとにコミットする
+        影響行数は全ての文の合計を返す
+        """
+        encoding = self.connection.encoding
+        prefix, suffix = (part.encode(encoding) for part in sql.split(row_template, 1))
+        # パケットヘッダ等のための余裕を確保する
+        max_bytes = self.get_max_allowed_packet() - 1024
+
+        affected_rows = 0
+        chunk: List[bytes] = []
+        chunk_bytes = len(prefix) + len(suffix)
+        for row in values:
+            literal = cursor.mogrify(row_template, row).encode(encoding)
+            if chunk and (chunk_bytes + len(literal) + 1 > max_bytes or len(chunk) == max_rows):
+                affected_rows += self._execute_chunk(cursor, prefix, chunk, suffix)
+                chunk = []
+                chunk_bytes = len(prefix) + len(suffix)
+            chunk.append(literal)
+            chunk_bytes += len(literal) + 1
+        if chunk:
+            affected_rows += self._execute_chunk(cursor, prefix, chunk, suffix)
+        return affected_rows
+
+    def _execute_chunk(self, cursor, prefix: bytes, chunk: List[bytes], suffix: bytes) -> int:
+        query = prefix + b",".join(chunk) + suffix
+        affected_rows = cursor.execute(query)
+        self.logger.debug(f"executed chunk. (rows: {len(chunk)}, bytes: {len(query)}, affected: {affected_rows})")
+        if self.commit_per_chunk:
+            self.connection.commit()
+        return affected_rows
+
     @rollback_on_fail
-    def insert(self, table_name: str, data: List[Dict]):
+    def insert(
+        self,
+        table_name: str,
+        data: Union[List[Dict], pd.DataFrame],
+        method: InsertMethod = InsertMethod.EXECUTEMANY,
+    ):
+        return self._insert(table_name, self.get_table_schema(table_name), data, method)
+
+    def _insert(
+        self,
+        table_name: str,
+        table_schema: TableSchema,
+        data: Union[List[Dict], pd.DataFrame],
+        method: InsertMethod,
+    ):
+        """table_schemaに従ってtable_nameに投入する。information_schemaに現れない一時テーブルにも使用する"""
+        if method == InsertMethod.LOAD_DATA:
+            return self._load_data(table_name, table_schema, data)
+
         cursor = self.connection.cursor()
 
         # 対象テーブルのカラム名からクエリを作成
-        table_schema = self.get_table_schema(table_name)
         tgt_columns = table_schema.get_column_names()
+        row_template = "({})".format(",".join(["%s"] * len(tgt_columns)))
         sql = """
-        INSERT INTO {table_name} ({column_names}) VALUES ({values})
+        INSERT INTO {table_name} ({column_names}) VALUES {values}
         """.format(
             table_name=self._escape(table_name),
             column_names=",".join([self._escape(k) for k in tgt_columns]),
-            values=",".join(["%s"] * len(tgt_columns)),
+            values=row_template,
         )
         # 挿入する値を用意
-        values = [
-            [
-                self._value_repr(table_schema.get_column_schema(col), row[col]) # type: ignore
-                for col in tgt_columns
-            ]
-            for row in data
-        ]
+        values = self._encode_rows(table_schema, data)
         self.logger.debug(f"{cursor.mogrify(sql, values[0])}")
-        affected_rows = cursor.executemany(sql, values)
+        affected_rows = self._execute_values(cursor, sql, row_template, values)
 
         self.validate_affected_count(affected_rows, data)
 
         return affected_rows
 
+    def _load_data(self, table_name: str, table_schema: TableSchema, data: Union[List[Dict], pd.DataFrame]):
+        """LOAD DATA LOCAL INFILEでデータを一括投入する
+        pymysqlはLOCAL INFILEのデータをファイルパスから読み込むため、バッチ単位で一時ファイルに書き出してから送信する
+        """
+        if not self.local_infile:
+            raise Exception("local_infile must be enabled to use LOAD DATA LOCAL INFILE.")
+        cursor = self.connection.cursor()
+
+        tgt_columns = table_schema.get_column_names()
+        sql = """
+        LOAD DATA LOCAL INFILE %s INTO TABLE {table_name}
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+        LINES TERMINATED BY '\\n'
+        ({column_names})
+        """.format(
+            table_name=self._escape(table_name),
+            column_names=",".join([self._escape(k) for k in tgt_columns]),
+        )
+
+        with tempfile.NamedTemporaryFile(
+            mode="w", encoding="utf-8", newline="", suffix=".tsv", delete=False
+        ) as f:
+            for row in self._encode_rows(table_schema, data):
+                f.write("\t".join([self._load_data_repr(v) for v in row]) + "\n")
+        try:
+            self.logger.debug(f"{cursor.mogrify(sql, (f.name,))}")
+            affected_rows = cursor.execute(sql, (f.name,))
+        finally:
+            os.remove(f.name)
+
+        # LOCAL指定時はキー重複や型変換のエラーが警告に格下げされるため、警告があれば失敗として扱う
+        warnings = self.connection.show_warnings()
+        if warnings:
+            raise Exception(f"LOAD DATA reported warnings: {warnings[:10]}")
+        self.validate_affected_count(affected_rows, data)
+        if self.commit_per_chunk:
+            self.connection.commit()
+
+        return affected_rows
+
+    @staticmethod
+    def _load_data_repr(value: Any) -> str:
+        """LOAD DATAのフィールド表現に変換する。NoneはNULLを表す\\Nになる"""
+        if value is None:
+            return "\\N"
+        if isinstance(value, bool):
+            return "1" if value else "0"
+        return (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+            .replace("\0", "\\0")
+        )
+
     @rollback_on_fail
-    def upsert(self, table_name: str, data: List[Dict]):
+    def upsert(self, table_name: str, data: Union[List[Dict], pd.DataFrame]):
         self.logger.info(f"start upsert {table_name}")
         cursor = self.connection.cursor()
 
@@ -198,43 +409,87 @@ class MySQLEngine(DBEngineInterface):
         table_schema = self.get_table_schema(table_name)
         tgt_columns = table_schema.get_column_names()
 
+        row_template = "({})".format(",".join(["%s"] * len(tgt_columns)))
         sql = """
-        INSERT INTO {table_name} ({column_names}) VALUES ({values}) as r
+        INSERT INTO {table_name} ({column_names}) VALUES {values} as r
         ON DUPLICATE KEY UPDATE {update_values}
         """.format(
             table_name=self._escape(table_name),
             column_names=",".join([self._escape(k) for k in tgt_columns]),
-            values=",".join(["%s"] * len(tgt_columns)),
+            values=row_template,
             update_values=",".join([f"{k}=r.{k}" for k in tgt_columns]),
         )
 
         # 挿入する値を用意
-        values = [
-            [
-                self._value_repr(table_schema.get_column_schema(col), row[col]) # type: ignore
-                for col in tgt_columns
-            ]
-            for row in data
-        ]
+        values = self._encode_rows(table_schema, data)
         self.logger.debug(f"{cursor.mogrify(sql, values[0])}")
-        affected_rows = cursor.executemany(sql, values)
+        affected_rows = self._execute_values(cursor, sql, row_template, values)
+        return affected_rows
+
+    @rollback_on_fail
+    def upsert_via_staging(
+        self,
+        table_name: str,
+        data: Union[List[Dict], pd.DataFrame],
+        method: InsertMethod = InsertMethod.EXECUTEMANY,
+    ):
+        """一時テーブルにmethodで一括投入してから、1文のINSERT ... SELECT ... ON DUPLICATE KEY UPDATEで対象テーブルに反映する
+        更新するのはプライマリーキー以外のカラムのみとする
+        """
+        self.logger.info(f"start upsert {table_name} via staging table")
+        cursor = self.connection.cursor()
+        table_schema = self.get_table_schema(table_name)
+        tgt_columns = table_schema.get_column_names()
+        pk_columns = table_schema.get_pk_column_names()
+        update_columns = [k for k in tgt_columns if k not in pk_columns] or list(pk_columns)
+
+        staging_table_name = self.create_staging_table(table_name, temporary=True)
+        try:
+            self._insert(staging_table_name, table_schema, data, method)
+            column_names = ",".join([self._escape(k) for k in tgt_columns])
+            sql = """
+            INSERT INTO {table_name} ({column_names})
+            SELECT * FROM (SELECT {column_names} FROM {staging_table_name}) AS r
+            ON DUPLICATE KEY UPDATE {update_values}
+            """.format(
+                table_name=self._escape(table_name),
+                column_names=column_names,
+                staging_table_name=self._escape(staging_table_name),
+                update_values=",".join([f"{self._escape(k)}=r.{self._escape(k)}" for k in update_columns]),
+            )
+            affected_rows = cursor.execute(sql)
+        finally:
+            # 一時テーブルの削除は暗黙的にコミットされない
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging_table_name}")
+        if self.commit_per_chunk:
+            self.connection.commit()
         return affected_rows
 
+    # 1文で削除するキーの数の上限。INのリストが大きすぎるとrange_optimizer_max_mem_sizeを超え、全件走査になるため
+    _DELETE_BATCH_SIZE = 5000
+
     @rollback_on_fail
-    def delete(self, table_name: str, data: List[Dict]):
+    def delete(self, table_name: str, data: Union[List[Dict], pd.DataFrame]):
+        """プライマリーキーが一致する行を削除する
+        キーはWHERE (pk1, pk2) IN ((...), (...)) にまとめ、max_allowed_packetと_DELETE_BATCH_SIZEに収まるよう文を分割する
+        """
         self.logger.info(f"start delete {table_name}")
         cursor = self.connection.cursor()
         table_schema = self.get_table_schema(table_name)
         primary_keys = table_schema.get_pk_column_names()
+        row_template = "({})".format(",".join(["%s"] * len(primary_keys)))
         sql = """
-        DELETE FROM {table_name} WHERE {where}
+        DELETE FROM {table_name} WHERE ({column_names}) IN ({values})
         """.format(
-            table_name=table_name,
-            where=" AND ".join([f"{key}=%s" for key in primary_keys]),
+            table_name=self._escape(table_name),
+            column_names=",".join([self._escape(k) for k in primary_keys]),
+            values=row_template,
         )
-        values = [[row[col] for col in primary_keys] for row in data]
-        self.logger.debug(f"{cursor.mogrify(sql, values[0])}")
-        affected_rows = cursor.executemany(sql, values)
+        if isinstance(data, pd.DataFrame):
+            values = list(zip(*(data[col].tolist() for col in primary_keys)))
+        else:
+            values = [[row[col] for col in primary_keys] for row in data]
+        affected_rows = self._execute_values(cursor, sql, row_template, values, max_rows=self._DELETE_BATCH_SIZE)
 
         self.validate_affected_count(affected_rows, data)
         return affected_rows
@@ -243,19 +498,135 @@ class MySQLEngine(DBEngineInterface):
     def truncate(self, table_name: str):
         cursor = self.connection.cursor()
         # 外部キーを一時的に無視してデータを削除
+        with self._foreign_key_checks_disabled():
+            return cursor.execute(f"TRUNCATE TABLE {table_name}")
+
+    @contextmanager
+    def _foreign_key_checks_disabled(self) -> Iterator[None]:
+        """ブロックの間、セッションの外部キーのチェックを無効にする
+        セッション変数はロールバックで戻らないため、元に戻せなかった接続はプールに返さずに閉じる
+        """
+        session_modified = self._session_modified
+        self._session_modified = True
+        cursor = self.connection.cursor()
         cursor.execute("SET SESSION FOREIGN_KEY_CHECKS=0")
-        affected_rows = cursor.execute(f"TRUNCATE TABLE {table_name}")
-        cursor.execute("SET SESSION FOREIGN_KEY_CHECKS=1")
-        return affected_rows
+        try:
+            yield
+        finally:
+            cursor.execute("SET SESSION FOREIGN_KEY_CHECKS=1")
+            self._session_modified = session_modified
+
+    @rollback_on_fail
+    def insert_into_staging(
+        self,
+        staging_table_name: str,
+        table_name: str,
+        data: Union[List[Dict], pd.DataFrame],
+        method: InsertMethod = InsertMethod.EXECUTEMANY,
+    ):
+        """create_staging_tableで作成したtable_nameの作業用テーブルに、table_nameの定義に従って投入する
+        一時テーブルはinformation_schemaに現れないため、カラムはtable_nameのものを使う
+        """
+        return self._insert(staging_table_name, self.get_table_schema(table_name), data, method)
+
+    def get_changed_rows(self, table_name: str, staging_table_name: str) -> pd.DataFrame:
+        """作業用テーブルの行のうち、table_nameにプライマリーキーが一致する行がないか、いずれかのカラムの値が異なる行を返す
+        比較はサーバ側でカラムの型のままNULL安全等価演算子(<=>)で行うため、値の文字列表現の違いによらない
+        """
+        table_schema = self.get_table_schema(table_name)
+        columns = table_schema.get_column_names()
+        pk_columns = table_schema.get_pk_column_names()
+        sql = """
+        SELECT {columns} FROM {staging_table_name} AS s LEFT JOIN {table_name} AS t ON {join_condition}
+        WHERE t.{pk_column} IS NULL OR NOT ({same_values})
+        """.format(
+            columns=",".join([f"s.{self._escape(k)}" for k in columns]),
+            staging_table_name=self._escape(staging_table_name),
+            table_name=self._escape(table_name),
+            join_condition=" AND ".join([f"s.{self._escape(k)} = t.{self._escape(k)}" for k in pk_columns]),
+            pk_column=self._escape(pk_columns[0]),
+            same_values=" AND ".join([f"s.{self._escape(k)} <=> t.{self._escape(k)}" for k in columns]),
+        )
+        return self._fetch_frame(sql, columns)
+
+    def get_missing_keys(self, table_name: str, staging_table_name: str) -> pd.DataFrame:
+        """table_nameの行のうち、作業用テーブルにプライマリーキーが一致する行がないもののプライマリーキーを返す"""
+        pk_columns = self.get_table_schema(table_name).get_pk_column_names()
+        sql = """
+        SELECT {pk_columns} FROM {table_name} AS t LEFT JOIN {staging_table_name} AS s ON {join_condition}
+        WHERE s.{pk_column} IS NULL
+        """.format(
+            pk_columns=",".join([f"t.{self._escape(k)}" for k in pk_columns]),
+            table_name=self._escape(table_name),
+            staging_table_name=self._escape(staging_table_name),
+            join_condition=" AND ".join([f"s.{self._escape(k)} = t.{self._escape(k)}" for k in pk_columns]),
+            pk_column=self._escape(pk_columns[0]),
+        )
+        return self._fetch_frame(sql, pk_columns)
+
+    def _fetch_frame(self, sql: str, columns: Sequence[str]) -> pd.DataFrame:
+        """SELECTの結果を、DBから取得した値のままのDataFrameとして返す"""
+        cursor = self.connection.cursor()
+        cursor.execute(sql)
+        return pd.DataFrame(list(cursor.fetchall()), columns=list(columns), dtype=object)
+
+    def create_staging_table(self, table_name: str, temporary: bool = False) -> str:
+        """table_nameと同じ定義(外部キーを除く)の作業用テーブルを作成し、その名前を返す
+        temporary=Trueの場合はセッション内でのみ参照できる一時テーブルとし、作成時に暗黙的なコミットは行われない
+        """
+        staging_table_name = f"{table_name[:40]}__stg_{uuid.uuid4().hex[:12]}"
+        cursor = self.connection.cursor()
+        temporary_clause = "TEMPORARY " if temporary else ""
+        cursor.execute(f"CREATE {temporary_clause}TABLE {staging_table_name} LIKE {table_name}")
+        return staging_table_name
+
+    def swap_table(self, table_name: str, shadow_table_name: str):
+        """shadow_table_nameをtable_nameにRENAME TABLEで入れ替え、元のテーブルを削除する
+        入れ替えは1文で行うため、他のセッションから対象テーブルが存在しない瞬間は見えない
+        """
+        old_table_name = f"{table_name[:40]}__old_{uuid.uuid4().hex[:12]}"
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"RENAME TABLE {table_name} TO {old_table_name}, {shadow_table_name} TO {table_name}"
+        )
+        self.invalidate_schema_cache(table_name)
+        self.drop_table(old_table_name)
+
+    def drop_table(self, table_name: str, temporary: bool = False):
+        """テーブルを削除する。DDLのため、未コミットの変更は暗黙的にコミットされる
+        temporary=Trueの場合は一時テーブルのみを削除し、暗黙的なコミットは行われない
+        """
+        cursor = self.connection.cursor()
+        temporary_clause = "TEMPORARY " if temporary else ""
+        cursor.execute(f"DROP {temporary_clause}TABLE IF EXISTS {table_name}")
+        self.invalidate_schema_cache(table_name)
+
+    @rollback_on_fail
+    def copy_rows(self, src_table_name: str, table_name: str, replace: bool = False) -> int:
+        """src_table_nameの全行をtable_nameに投入する
+        replace=Trueの場合は、外部キーを一時的に無視して既存の行を全て削除してから投入する
+        削除と投入は同じトランザクションで行い、呼び出し元のコミットでまとめて反映される
+        """
+        cursor = self.connection.cursor()
+        column_names = ",".join(
+            [self._escape(k) for k in self.get_table_schema(table_name).get_column_names()]
+        )
+        sql = """
+        INSERT INTO {table_name} ({column_names}) SELECT {column_names} FROM {src_table_name}
+        """.format(
+            table_name=self._escape(table_name),
+            column_names=column_names,
+            src_table_name=self._escape(src_table_name),
+        )
+        if not replace:
+            return cursor.execute(sql)
+
+        with self._foreign_key_checks_disabled():
+            cursor.execute(f"DELETE FROM {table_name}")
+            return cursor.execute(sql)
 
     def commit(self):
-        self._ping()
         self.connection.commit()
 
-    def _ping(self):
-        """前回チェックから3分以上経っていたらタイムアウトかを確認して、必要なら再接続"""
-        current_time = time.time()
-        if current_time - self.last_ping_time > 60 * 3:
-            self.connection.ping(reconnect=True)
-            self.last_ping_time = current_time
-
+    def rollback(self):
+        self.connection.rollback()
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from utils.logger import get_logger
+
+
+class ConnectionPool:
+    """
+    DB接続を再利用するためのプール
+
+    max_size: 同時に貸し出す接続数の上限。上限に達した場合はacquire_timeout秒まで返却を待つ
+    idle_timeout: 返却後この秒数を超えて使われなかった接続は閉じる
+    health_check_interval: 返却後この秒数を超えた接続は、貸し出し前にpingで死活確認し、応答がなければ作り直す
+    返却された接続は未コミットの変更をロールバックしてから再利用する
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_size: int = 16,
+        idle_timeout: float = 600,
+        health_check_interval: float = 60,
+        acquire_timeout: Optional[float] = 600,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer.")
+        self.logger = get_logger(__name__)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._connect = connect
+        self._idle: Deque[Tuple[float, Any]] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self):
+        """接続を貸し出す。利用後は必ずreleaseで返却すること"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"could not acquire a connection within {self.acquire_timeout}s (max_size: {self.max_size})")
+        try:
+            while True:
+                entry = self._pop_idle()
+                if entry is None:
+                    return self._connect()
+                released_at, connection = entry
+                if time.monotonic() - released_at <= self.health_check_interval:
+                    return connection
+                if self._is_alive(connection):
+                    return connection
+                self.logger.info("discard a dead connection.")
+                self._close(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, discard: bool = False):
+        """接続を返却する。discard=Trueの場合や、接続の状態をリセットできない場合は接続を閉じる"""
+        try:
+            if not discard and connection.open:
+                try:
+                    connection.rollback()
+                except Exception:
+                    discard = True
+            else:
+                discard = True
+
+            if discard:
+                self._close(connection)
+                return
+            with self._lock:
+                self._idle.append((time.monotonic(), connection))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """プール中の未使用の接続を全て閉じる"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for _, connection in idle:
+            self._close(connection)
+
+    def _pop_idle(self) -> Optional[Tuple[float, Any]]:
+        """最後に返却された接続を取り出す。idle_timeoutを超えた接続はここで閉じる"""
+        expired = []
+        entry = None
+        with self._lock:
+            now = time.monotonic()
+            while self._idle and now - self._idle[0][0] > self.idle_timeout:
+                expired.append(self._idle.popleft()[1])
+            if self._idle:
+                entry = self._idle.pop()
+        for connection in expired:
+            self._close(connection)
+        return entry
+
+    @staticmethod
+    def _is_alive(connection) -> bool:
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+# プロセス内で共有する接続プール
+_pools: Dict[Hashable, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+# configure_connection_poolsで指定したプールの設定
+_pool_options: Dict[str, Any] = {}
+POOL_OPTION_NAMES = ("max_size", "idle_timeout", "health_check_interval", "acquire_timeout")
+
+
+def configure_connection_pools(**options):
+    """以降に生成する接続プールの設定(max_size, idle_timeout, health_check_interval, acquire_timeout)を指定する
+    設定ファイルの[mysql_pool]より優先する。生成済みのプールには反映されないため、必要に応じて先にclose_connection_poolsを呼ぶこと
+    """
+    unknown = set(options) - set(POOL_OPTION_NAMES)
+    if unknown:
+        raise ValueError(f"unknown connection pool options: {sorted(unknown)}")
+    if options.get("max_size") is not None and options["max_size"] < 1:
+        raise ValueError("max_size must be a positive integer.")
+    with _pools_lock:
+        _pool_options.update(options)
+
+
+def get_connection_pool(key: Hashable, connect: Callable[[], Any], **options) -> ConnectionPool:
+    """keyに対応する接続プールを取得する。存在しない場合はconnectで接続を作るプールを生成する
+    optionsはプールの設定で、configure_connection_poolsで指定した値があればそちらを使う
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(connect, **{**options, **_pool_options})
+        return pool
+
+
+def close_connection_pools():
+    """全ての接続プールの未使用の接続を閉じ、プールを破棄する"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,45 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from tasks.models.model import TableSchema
+
+
+class TableSchemaCache:
+    """
+    (DB名, テーブル名)をキーにテーブルスキーマを保持するキャッシュ
+
+    ttl秒より前に取得したエントリは無効とみなし、再取得させる
+    DDLでテーブル定義が変わる場合はinvalidateで明示的に無効化すること
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[Optional[str], str], Tuple[float, TableSchema]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db_name: Optional[str], table_name: str) -> Optional[TableSchema]:
+        key = (db_name, table_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            cached_at, table_schema = entry
+            if time.monotonic() - cached_at > self.ttl:
+                del self._entries[key]
+                return None
+            return table_schema
+
+    def set(self, db_name: Optional[str], table_name: str, table_schema: TableSchema):
+        with self._lock:
+            self._entries[(db_name, table_name)] = (time.monotonic(), table_schema)
+
+    def invalidate(self, db_name: Optional[str] = None, table_name: Optional[str] = None):
+        """指定したDB・テーブルのエントリを無効化する。未指定の条件は全てに一致するものとして扱う"""
+        with self._lock:
+            for key in list(self._entries):
+                if db_name is not None and key[0] != db_name:
+                    continue
+                if table_name is not None and key[1] != table_name:
+                    continue
+                del self._entries[key]
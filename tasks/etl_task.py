@@ -1,9 +1,29 @@
-from typing import Dict, List, Optional
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import ExitStack, nullcontext
+from itertools import chain
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, List, Optional, Sequence, Tuple
 from abc import abstractmethod, ABCMeta
 
+from tasks.aio import AsyncDBEngine, run_blocking
+from tasks.data_formatter import FormatterInterface
+from tasks.data_reader import MultiObjectSource
 from tasks.engines.factory import DBFactory
-from tasks.models.operation import DataSrc, OperationTarget, OperationType
+from tasks.models.model import TableSchema
+from tasks.models.operation import DataSrc, InsertMethod, OperationTarget, OperationType, ReloadStrategy, UpsertMethod
+from tasks.incremental_load import IncrementalLoader
+from tasks.metrics import MeteredDBEngine, MeteredFormatter, MeteredIO, RunReport, reporting
+from tasks.parallel_load import PartitionedLoader
+from tasks.pipeline import PipelinedSource
 from utils.logger import get_logger
+from utils.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
 
 
 class TaskInterface(metaclass=ABCMeta):
@@ -24,14 +44,36 @@ class DDLTask(TaskInterface):
         if self.target.table_name is not None:
             self.logger.warning(f"table_name: {self.target.table_name} is ignored when executing DDLTask")
 
-    def run(self, sqls: List[str]):
+    def run(self, sqls: List[str]) -> RunReport:
         self.logger.info(f"DDL {self.target}")
 
-        with self.db_engine as db:
-            for sql in sqls:
-                self.logger.debug(f"execute: {sql}")
-                db.execute(sql)
-            db.commit()
+        with reporting(RunReport("DDLTask", "DDL", repr(self.target))) as report:
+            with MeteredDBEngine(self.db_engine, report) as db:
+                try:
+                    for sql in sqls:
+                        self.logger.debug(f"execute: {sql}")
+                        db.execute(sql)
+                    db.commit()
+                finally:
+                    # DDLはテーブル定義を変更しうるため、途中で失敗した場合も含めてキャッシュを破棄する
+                    db.invalidate_schema_cache()
+        return report
+
+    async def run_async(self, sqls: List[str], semaphore: Optional[asyncio.Semaphore] = None) -> RunReport:
+        """runのasyncio版。semaphoreを指定した場合、その同時実行数の制限に従う"""
+        async with semaphore or nullcontext():
+            self.logger.info(f"DDL {self.target}")
+
+            with reporting(RunReport("DDLTask", "DDL", repr(self.target))) as report:
+                async with AsyncDBEngine(MeteredDBEngine(self.db_engine, report)) as db:
+                    try:
+                        for sql in sqls:
+                            self.logger.debug(f"execute: {sql}")
+                            await db.execute(sql)
+                        await db.commit()
+                    finally:
+                        await db.invalidate_schema_cache()
+            return report
 
     def purge_binlog(self):
         self.logger.info("purge binlog")
@@ -46,10 +88,32 @@ class DMLTask(TaskInterface):
         target: OperationTarget,
         operaton: OperationType,
         source: Optional[DataSrc] = None,
+        insert_method: InsertMethod = InsertMethod.EXECUTEMANY,
+        commit_per_chunk: bool = False,
+        pipelined: bool = False,
+        queue_size: int = 4,
+        parallelism: int = 1,
+        reload_strategy: ReloadStrategy = ReloadStrategy.TRUNCATE,
+        upsert_method: UpsertMethod = UpsertMethod.VALUES,
     ):
         self.source = source
         self.target = target
         self.operation = operaton
+        self.insert_method = insert_method
+        # Trueの場合、max_allowed_packetに収まるよう分割した文ごとにコミットする
+        # 失敗時にロールバックされるのは失敗した文のみとなる
+        self.commit_per_chunk = commit_per_chunk
+        # Trueの場合、ソースの読み込み・パースを別スレッドで行い、書き込みと並行に進める
+        # 段の間のキューはqueue_size個までとする
+        self.pipelined = pipelined
+        self.queue_size = queue_size
+        # 2以上の場合、INSERT/RELOADをプライマリーキーで分割し、parallelism本の接続から並列に書き込む
+        self.parallelism = parallelism
+        # SHADOWの場合、RELOADは別テーブルに投入してから入れ替え、投入中も既存の行を参照できるようにする
+        # INCREMENTALの場合、RELOADは対象テーブルとの差分の行のみを書き込む
+        self.reload_strategy = reload_strategy
+        # STAGINGの場合、UPSERTは一時テーブルにinsert_methodで投入してから対象テーブルにまとめて反映する
+        self.upsert_method = upsert_method
         self.logger = get_logger(__name__)
 
         # 厳密にはTruncateはDDLだが、簡便さのためDMLTaskとして扱う
@@ -57,50 +121,185 @@ class DMLTask(TaskInterface):
             self.source or self.operation == OperationType.TRUNCATE
         ), "source is required when operation is not truncate"
 
-    def run(self):
-        self.db_engine = DBFactory.get_engine(self.target)
-        if self.source:
-            raw_data = self.source.location.read()
-            self.data = self.source.format.parse(raw_data)
+    def run(self) -> RunReport:
+        """タスクを実行し、段ごとの計測結果を返す"""
+        self.db_engine = self._new_engine()
+        with reporting(self._new_report()) as report:
+            with MeteredDBEngine(self.db_engine, report) as db:
+                self._run_blocking(db, report)
+        return report
 
-        # 実行
-        self.logger.info(f"{self.operation.name} {self.target}")
+    async def run_async(self, semaphore: Optional[asyncio.Semaphore] = None) -> RunReport:
+        """runのasyncio版。semaphoreを指定した場合、その同時実行数の制限に従う
+        接続の取得・返却はイベントループから、ソースの読み込み・パース・書き込みはrunと同じ処理を共有スレッドプールの1スレッドで実行する
+        全ての操作・戦略・オプション(pipelined・parallelism等)はrunと同じく扱われる
+        """
+        async with semaphore or nullcontext():
+            self.db_engine = self._new_engine()
+            with reporting(self._new_report()) as report:
+                async with AsyncDBEngine(MeteredDBEngine(self.db_engine, report)) as db:
+                    await run_blocking(self._run_blocking, db.engine, report)
+            return report
+
+    def _new_engine(self):
+        return DBFactory.get_engine(
+            self.target,
+            local_infile=self.insert_method == InsertMethod.LOAD_DATA,
+            commit_per_chunk=self.commit_per_chunk,
+        )
+
+    def _run_blocking(self, db, report: RunReport):
+        # 読み込んだファイルハンドルはバッチを全て書き込み終えるまで保持し、最後に必ず閉じる
+        with ExitStack() as stack:
+            data: Iterable[pd.DataFrame] = []
+            if self.source:
+                columns = self._get_source_columns(db.get_table_schema(self.target.table_name))
+                raw_data, formatter = self._open_source(report, columns)
+                raw_data = stack.enter_context(self._meter_source(raw_data, report))
+                formatter = MeteredFormatter(formatter, report)
+                if self.pipelined:
+                    pipeline = stack.enter_context(
+                        PipelinedSource(raw_data, formatter, columns=columns, queue_size=self.queue_size)
+                    )
+                    data = self._prefetch(iter(pipeline))
+                else:
+                    data = self._prefetch(self._parse_source(formatter, raw_data, columns))
+
+            self.logger.info(f"{self.operation.name} {self.target}")
+            self._execute(db, data, self.target.table_name, report)
+
+    def _execute(self, db, data: Iterable[pd.DataFrame], table_name, report: RunReport):
+        """操作を実行する。run・run_asyncで共通の入口で、全ての操作・戦略はここで扱う"""
         match self.operation:
             case OperationType.TRUNCATE:
-                self.__truncate_table(self.target.table_name)
+                self.__truncate_table(db, table_name)
             case OperationType.INSERT:
-                self.__insert_into_table(self.data, self.target.table_name)
+                self.__insert_into_table(db, data, table_name, report)
             case OperationType.UPSERT:
-                self.__upsert_into_table(self.data, self.target.table_name)
+                self.__upsert_into_table(db, data, table_name)
             case OperationType.DELETE:
-                self.__delete_from_table(self.data, self.target.table_name)
+                self.__delete_from_table(db, data, table_name)
             case OperationType.RELOAD:
-                self.__reload_table(self.data, self.target.table_name)
+                self.__reload_table(db, data, table_name, report)
             case _:
                 raise NotImplementedError()
 
-    def __reload_table(self, data: List[Dict], table_name):
-        with self.db_engine as db:
-            db.truncate(table_name)
-            db.insert(table_name, data)
-            db.commit()
+    def _new_report(self) -> RunReport:
+        return RunReport("DMLTask", self.operation.name, repr(self.target))
 
-    def __truncate_table(self, table_name):
-        with self.db_engine as db:
-            db.truncate(table_name)
-            db.commit()
+    def _open_source(self, report: RunReport, columns: Sequence[str]) -> Tuple[Any, FormatterInterface]:
+        """ソースを開き、そのストリームとパースに使用するフォーマッタを返す
+        S3等ではここで取得が行われるため、読み込み時間として計上する
+        パース結果のキャッシュがある場合は、ソースの代わりにキャッシュを読み込む
+        """
+        source: DataSrc = self.source  # type: ignore
+        start = time.perf_counter()
+        if source.cache is not None:
+            raw_data, formatter = source.cache.open(source.location, source.format, columns=columns)
+        else:
+            raw_data, formatter = source.location.read(), source.format
+        report.add_read(0, time.perf_counter() - start)
+        return raw_data, formatter
 
-    def __insert_into_table(self, data: List[Dict], table_name):
-        with self.db_engine as db:
-            db.insert(table_name, data)
-            db.commit()
+    @staticmethod
+    def _meter_source(raw_data, report: RunReport):
+        if isinstance(raw_data, MultiObjectSource):
+            return raw_data.map(lambda part: MeteredIO(part, report))
+        return MeteredIO(raw_data, report)
 
-    def __upsert_into_table(self, data: List[Dict], table_name):
-        with self.db_engine as db:
-            db.upsert(table_name, data)
-            db.commit()
+    @staticmethod
+    def _parse_source(formatter, raw_data, columns: Sequence[str]) -> Iterator[pd.DataFrame]:
+        """ソースをパースする。複数のオブジェクトからなるソースは、オブジェクトごとにパースして1つのバッチ列とする"""
+        if isinstance(raw_data, MultiObjectSource):
+            return formatter.parse_parts(raw_data, columns=columns)
+        return formatter.parse_frames(raw_data, columns=columns)
 
-    def __delete_from_table(self, data: List[Dict], table_name):
-        with self.db_engine as db:
-            db.delete(table_name, data)
-            db.commit()
+    def _get_source_columns(self, table_schema: TableSchema) -> Tuple[str, ...]:
+        """ソースから読み込む必要のあるカラム名を返す。DELETEはプライマリーキーのみを使用する"""
+        if self.operation == OperationType.DELETE:
+            return table_schema.get_pk_column_names()
+        return table_schema.get_column_names()
+
+    @staticmethod
+    def _prefetch(batches: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """先頭バッチのみ先読みする
+        パース設定の誤りをTRUNCATE等のDB操作より前に検出するため
+        """
+        first = next(batches, None)
+        if first is None:
+            return iter(())
+        return chain([first], batches)
+
+    def __reload_table(self, db, data: Iterable[pd.DataFrame], table_name, report: RunReport):
+        if self.reload_strategy == ReloadStrategy.SHADOW:
+            self.__reload_table_via_shadow(db, data, table_name, report)
+            return
+        if self.reload_strategy == ReloadStrategy.INCREMENTAL:
+            IncrementalLoader(self.target, insert_method=self.insert_method).load(db, data)
+            return
+        if self.parallelism > 1:
+            self._partitioned_loader(report).load(db, data, replace=True)
+            return
+        db.truncate(table_name)
+        for batch in data:
+            db.insert(table_name, batch, method=self.insert_method)
+        db.commit()
+
+    def __reload_table_via_shadow(self, db, data: Iterable[pd.DataFrame], table_name, report: RunReport):
+        self._assert_swappable(db.get_foreign_keys(), table_name)
+        shadow_table_name = db.create_staging_table(table_name)
+        try:
+            if self.parallelism > 1:
+                pk_columns = db.get_table_schema(table_name).get_pk_column_names()
+                self._partitioned_loader(report).load_partitions(shadow_table_name, pk_columns, data)
+            else:
+                for batch in data:
+                    db.insert(shadow_table_name, batch, method=self.insert_method)
+                db.commit()
+            db.swap_table(table_name, shadow_table_name)
+        finally:
+            db.drop_table(shadow_table_name)
+
+    @staticmethod
+    def _assert_swappable(foreign_keys: Iterable[Tuple[str, str]], table_name: str):
+        """RENAME TABLEで入れ替えられるテーブルか確認する
+        CREATE TABLE ... LIKEは外部キーを複製せず、他テーブルからの外部キーはRENAME後も元のテーブルを参照し続けるため、
+        外部キーに関わるテーブルは入れ替えられない
+        """
+        related = [fk for fk in foreign_keys if table_name in fk]
+        if related:
+            raise ValueError(f"{table_name} has foreign keys {related}. use ReloadStrategy.TRUNCATE to reload it.")
+
+    def _partitioned_loader(self, report: RunReport) -> PartitionedLoader:
+        return PartitionedLoader(
+            self.target,
+            self.parallelism,
+            insert_method=self.insert_method,
+            queue_size=self.queue_size,
+            report=report,
+        )
+
+    def __truncate_table(self, db, table_name):
+        db.truncate(table_name)
+        db.commit()
+
+    def __insert_into_table(self, db, data: Iterable[pd.DataFrame], table_name, report: RunReport):
+        if self.parallelism > 1:
+            self._partitioned_loader(report).load(db, data)
+            return
+        for batch in data:
+            db.insert(table_name, batch, method=self.insert_method)
+        db.commit()
+
+    def __upsert_into_table(self, db, data: Iterable[pd.DataFrame], table_name):
+        for batch in data:
+            if self.upsert_method == UpsertMethod.STAGING:
+                db.upsert_via_staging(table_name, batch, method=self.insert_method)
+            else:
+                db.upsert(table_name, batch)
+        db.commit()
+
+    def __delete_from_table(self, db, data: Iterable[pd.DataFrame], table_name):
+        for batch in data:
+            db.delete(table_name, batch)
+        db.commit()
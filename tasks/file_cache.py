@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from utils.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+
+
+class FileCache:
+    """
+    ローカルディスク上の、サイズ上限付きのファイルキャッシュ
+
+    エントリはキーのハッシュをファイル名とし、書き込みは一時ファイルからのos.replaceで行う
+    ロックファイル(.fill-xx.lock, .evict.lock)は固定の個数で、エントリには含めない
+    合計サイズがmax_bytesを超えた場合、最後に参照されてから最も時間の経ったものから削除する(参照時刻にはmtimeを使う)
+    同じエントリの作成とLRUの削除はファイルロックでプロセス間で排他するため、
+    複数のプロセスから同じディレクトリを共有できる(ロックはfcntlが使える環境のみ)
+    """
+
+    SUFFIX = ".bin"
+
+    def __init__(self, directory: str, max_bytes: int = 10 * 1024 * 1024 * 1024):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be a positive integer.")
+        self.logger = get_logger(__name__)
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def entry_path(self, *key: str) -> Path:
+        digest = hashlib.sha256("\0".join(key).encode()).hexdigest()
+        return self.directory / f"{digest}{self.SUFFIX}"
+
+    def fill_lock(self, path: Path):
+        """エントリの作成を排他するロックを返す
+        ロックファイルはエントリのハッシュの先頭2文字ごとに共有し、キーやETagが増えても高々256個に抑える
+        (ロックファイルを削除すると、待機中のプロセスと排他できなくなるため削除しない)
+        """
+        return self.lock(self.directory / f".fill-{path.name[:2]}.lock")
+
+    def evict(self, keep: Optional[Path] = None):
+        """合計サイズがmax_bytes以下になるまで、最後に参照されてから最も時間の経ったものから削除する
+        keepは合計サイズに含めるが削除しない
+        """
+        with self.lock(self.directory / ".evict.lock"):
+            entries = []
+            for path in self.directory.glob(f"*{self.SUFFIX}"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                # 読み込み中のプロセスはファイルを開いたままなので、削除しても読み込みは継続できる
+                path.unlink(missing_ok=True)
+                total -= size
+                self.logger.info(f"evict {path.name} ({size} bytes)")
+
+    @staticmethod
+    def touch(path: Path) -> bool:
+        """存在すればLRUのために最終参照時刻(mtime)を更新してTrueを返す"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @staticmethod
+    @contextmanager
+    def lock(path: Path) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
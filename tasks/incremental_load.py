@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Tuple
+
+from tasks.models.operation import InsertMethod, OperationTarget
+from utils.logger import get_logger
+from utils.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+
+class IncrementalLoader:
+    """
+    対象テーブルの内容をソースと同じにするために必要な行のみを書き込む
+
+    ソースを対象テーブルと同じ定義の一時テーブルにinsert_methodで一括投入し、サーバ側で対象テーブルとプライマリーキーで突き合わせる
+    値はカラムの型に変換された状態で比較するため、キーや値の文字列表現の違い(日付・小数等)で同じ行を別の行と判定することはない
+    対象テーブルにのみある行をDELETE、一時テーブルにのみある行と値が異なる行をUPSERTする
+    一時テーブルはセッション内でのみ参照でき、ROW・MIXED形式のバイナリログには書き込まれないため、
+    対象テーブルへの書き込み・バイナリログ・レプリカの遅延は差分の大きさに比例する
+    ソースにプライマリーキーの重複がある場合は、一時テーブルへの投入時に失敗する
+    """
+
+    def __init__(self, target: OperationTarget, insert_method: InsertMethod = InsertMethod.EXECUTEMANY):
+        self.target = target
+        self.insert_method = insert_method
+        self.logger = get_logger(__name__)
+
+    def load(self, db, data: Iterable[pd.DataFrame]) -> Tuple[int, int]:
+        """dataとの差分を対象テーブルに反映し、(UPSERTした行数, DELETEした行数)を返す。コミットまで行う"""
+        table_name = self.target.table_name
+        if not db.get_table_schema(table_name).get_pk_column_names():
+            raise ValueError(f"{table_name} has no primary key.")
+
+        staging_table_name = db.create_staging_table(table_name, temporary=True)
+        try:
+            source_rows = 0
+            for df in data:
+                db.insert_into_staging(staging_table_name, table_name, df, method=self.insert_method)
+                source_rows += len(df)
+
+            deleted = db.get_missing_keys(table_name, staging_table_name)
+            changed = db.get_changed_rows(table_name, staging_table_name)
+            self.logger.info(
+                f"{self.target}: {source_rows} rows in source, {len(changed)} to upsert, {len(deleted)} to delete"
+            )
+
+            if len(deleted) > 0:
+                db.delete(table_name, deleted)
+            if len(changed) > 0:
+                db.upsert(table_name, changed)
+            db.commit()
+        finally:
+            # 一時テーブルの削除は暗黙的にコミットされないため、失敗時も未コミットの変更はロールバックされる
+            db.drop_table(staging_table_name, temporary=True)
+        return len(changed), len(deleted)
@@ -0,0 +1,124 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Set, Tuple
+
+from tasks.engines.factory import DBFactory
+from tasks.etl_task import DMLTask
+from tasks.models.operation import OperationTarget, OperationType
+from utils.logger import get_logger
+
+
+class DMLJobRunner:
+    """
+    複数のDMLTaskを、外部キーによる依存関係を考慮して並列に実行する
+
+    INSERT/UPSERT/RELOADは参照先テーブルを先に、DELETE/TRUNCATEは参照元テーブルを先に実行する
+    同じテーブルに対するタスク、および書き込みと削除が混在する場合は渡された順に実行する
+    依存関係のないタスクはmax_workers個のスレッドで同時に実行する
+    """
+
+    write_operations = (OperationType.INSERT, OperationType.UPSERT, OperationType.RELOAD)
+    remove_operations = (OperationType.DELETE, OperationType.TRUNCATE)
+
+    def __init__(self, tasks: List[DMLTask], max_workers: int = 4):
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive integer.")
+        self.tasks = tasks
+        self.max_workers = max_workers
+        self.logger = get_logger(__name__)
+
+    def run(self):
+        foreign_keys = self._get_foreign_keys()
+        dependencies = self.build_dependencies(self.tasks, foreign_keys)
+        self.logger.info(
+            f"run {len(self.tasks)} tasks. (max_workers: {self.max_workers}, dependencies: {sum(len(d) for d in dependencies.values())})"
+        )
+
+        remaining = {i: set(deps) for i, deps in dependencies.items()}
+        running: Dict[Future, int] = {}
+        error: Optional[BaseException] = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                # 失敗後は新たなタスクを開始せず、実行中のタスクの完了のみ待つ
+                if error is None:
+                    for i in sorted(i for i, deps in remaining.items() if not deps):
+                        del remaining[i]
+                        running[executor.submit(self.tasks[i].run)] = i
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    if future.exception() is not None:
+                        self.logger.error(f"task failed: {self.tasks[i].operation.name} {self.tasks[i].target}")
+                        error = error or future.exception()
+                        continue
+                    for deps in remaining.values():
+                        deps.discard(i)
+
+        if error is not None:
+            raise error
+
+    @classmethod
+    def build_dependencies(
+        cls,
+        tasks: List[DMLTask],
+        foreign_keys: Dict[Tuple[str, str], Set[Tuple[str, str]]],
+    ) -> Dict[int, Set[int]]:
+        """タスクの添字から、先に完了している必要のあるタスクの添字の集合への対応を返す
+
+        foreign_keys: 参照元テーブルから参照先テーブルの集合への対応。テーブルは("エンジン://DB名", テーブル名)で表す
+        """
+        dependencies: Dict[int, Set[int]] = {i: set() for i in range(len(tasks))}
+        for later in range(len(tasks)):
+            for earlier in range(later):
+                a, b = tasks[earlier], tasks[later]
+                if cls._table_key(a.target) == cls._table_key(b.target):
+                    dependencies[later].add(earlier)
+                    continue
+                a_refs_b = cls._table_key(b.target) in foreign_keys.get(cls._table_key(a.target), set())
+                b_refs_a = cls._table_key(a.target) in foreign_keys.get(cls._table_key(b.target), set())
+                if not (a_refs_b or b_refs_a):
+                    continue
+
+                if a.operation in cls.write_operations and b.operation in cls.write_operations:
+                    # 参照先を先に書き込む
+                    dependencies[earlier if a_refs_b else later].add(later if a_refs_b else earlier)
+                elif a.operation in cls.remove_operations and b.operation in cls.remove_operations:
+                    # 参照元を先に削除する
+                    dependencies[later if a_refs_b else earlier].add(earlier if a_refs_b else later)
+                else:
+                    dependencies[later].add(earlier)
+
+        cls._assert_acyclic(tasks, dependencies)
+        return dependencies
+
+    @staticmethod
+    def _table_key(target: OperationTarget) -> Tuple[str, str]:
+        return (f"{target.engine_option}://{target.db_name}", target.table_name)
+
+    @staticmethod
+    def _assert_acyclic(tasks: List[DMLTask], dependencies: Dict[int, Set[int]]):
+        remaining = {i: set(deps) for i, deps in dependencies.items()}
+        while remaining:
+            ready = [i for i, deps in remaining.items() if not deps]
+            if not ready:
+                cycle = ", ".join(str(tasks[i].target) for i in sorted(remaining))
+                raise ValueError(f"circular dependency between tasks: {cycle}")
+            for i in ready:
+                del remaining[i]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def _get_foreign_keys(self) -> Dict[Tuple[str, str], Set[Tuple[str, str]]]:
+        """対象DBごとに外部キーの参照関係を取得する"""
+        foreign_keys: Dict[Tuple[str, str], Set[Tuple[str, str]]] = {}
+        databases = {(t.target.engine_option, t.target.db_name) for t in self.tasks}
+        for engine_option, db_name in sorted(databases):
+            with DBFactory.get_engine(OperationTarget(engine_option, db_name, None)) as db:
+                for table_name, referenced_table_name in db.get_foreign_keys():
+                    if table_name == referenced_table_name:
+                        continue
+                    db_key = f"{engine_option}://{db_name}"
+                    foreign_keys.setdefault((db_key, table_name), set()).add((db_key, referenced_table_name))
+        return foreign_keys
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import json
+import mmap
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from io import RawIOBase
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence
+
+from tasks.data_formatter import FormatterInterface
+from utils.logger import get_logger
+from utils.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+
+class RunReport:
+    """
+    タスク1回の実行における段ごとの計測結果
+
+    read_seconds: ソースの取得・読み込みでブロックした時間
+    parse_seconds: パースに要した時間。同じスレッドでの読み込み待ちは含まない(パイプライン実行時は読み込み段の待ちを含む)
+    write_latencies: 書き込み(insert/upsert/delete・SQL実行等)1回ごとの所要時間
+    peak_memory_bytes: 実行中に一定間隔で取得したプロセスのRSSの最大値。並行して実行中の他のタスクの分を含む
+                       RSSを取得できない環境(Linux以外)ではNone
+    """
+
+    def __init__(self, task: str, operation: str, target: str):
+        self.task = task
+        self.operation = operation
+        self.target = target
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.elapsed_seconds = 0.0
+        self.bytes_read = 0
+        self.read_seconds = 0.0
+        self.rows_parsed = 0
+        self.parse_seconds = 0.0
+        self.write_latencies: List[float] = []
+        self.rows_written = 0
+        self.commit_seconds = 0.0
+        self.peak_memory_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = time.perf_counter()
+
+    def add_read(self, nbytes: int, seconds: float):
+        with self._lock:
+            self.bytes_read += nbytes
+            self.read_seconds += seconds
+        # 同じスレッドのパース時間から読み込み待ちを除くため、スレッドごとにも積算する
+        self._local.read_seconds = getattr(self._local, "read_seconds", 0.0) + seconds
+
+    def add_parse(self, rows: int, seconds: float):
+        with self._lock:
+            self.rows_parsed += rows
+            self.parse_seconds += seconds
+
+    def add_write(self, rows: int, seconds: float):
+        with self._lock:
+            self.rows_written += rows
+            self.write_latencies.append(seconds)
+
+    def add_commit(self, seconds: float):
+        with self._lock:
+            self.commit_seconds += seconds
+
+    def thread_read_seconds(self) -> float:
+        return getattr(self._local, "read_seconds", 0.0)
+
+    def finish(self, error: Optional[BaseException] = None, peak_memory_bytes: Optional[int] = None):
+        self.elapsed_seconds = time.perf_counter() - self._start
+        self.status = "failed" if error is not None else "succeeded"
+        self.error = repr(error) if error is not None else None
+        self.peak_memory_bytes = peak_memory_bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.write_latencies)
+        return {
+            "task": self.task,
+            "operation": self.operation,
+            "target": self.target,
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "elapsed_seconds": self.elapsed_seconds,
+            "bytes_read": self.bytes_read,
+            "read_seconds": self.read_seconds,
+            "rows_parsed": self.rows_parsed,
+            "parse_seconds": self.parse_seconds,
+            "rows_per_sec_parsed": self.rows_parsed / self.parse_seconds if self.parse_seconds > 0 else None,
+            "write_count": len(latencies),
+            "write_seconds": sum(latencies),
+            "write_latency_p50": self._percentile(latencies, 0.5),
+            "write_latency_max": latencies[-1] if latencies else None,
+            "rows_written": self.rows_written,
+            "commit_seconds": self.commit_seconds,
+            "peak_memory_bytes": self.peak_memory_bytes,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    @staticmethod
+    def _percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+        if not sorted_values:
+            return None
+        return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+class MetricsSinkInterface(metaclass=ABCMeta):
+    """RunReportの送信先。emitで発生した例外はログに残して無視する"""
+
+    @abstractmethod
+    def emit(self, report: RunReport):
+        raise NotImplementedError()
+
+
+_sinks: List[MetricsSinkInterface] = []
+_sinks_lock = threading.Lock()
+
+
+def add_metrics_sink(sink: MetricsSinkInterface):
+    """全てのタスクのRunReportを受け取る送信先を追加する"""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_metrics_sink(sink: MetricsSinkInterface):
+    with _sinks_lock:
+        _sinks.remove(sink)
+
+
+def emit_report(report: RunReport):
+    """RunReportを1行のJSONとしてログに出力し、登録された送信先に渡す"""
+    logger = get_logger(__name__)
+    logger.info(report.to_json())
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.emit(report)
+        except Exception as e:
+            logger.warning(f"metrics sink {sink!r} failed: {e!r}")
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """プロセスの現在のRSSを返す。/proc/self/statmがない環境ではNone"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RssSampler:
+    """
+    start・stopの間、プロセスのRSSをinterval秒ごとに取得し、その最大値を求める
+
+    getrusageのru_maxrssはプロセス開始からの最大値のため、長時間動くプロセスでは実行ごとの値にならない
+    interval未満の一時的な増加は捉えられない場合がある
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._sample()
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> Optional[int]:
+        """取得を終了し、RSSの最大値を返す"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+        return self.peak
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = _current_rss_bytes()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+
+@contextmanager
+def reporting(report: RunReport) -> Iterator[RunReport]:
+    """ブロックの終了時(失敗時を含む)にRunReportを確定して送信する。最大メモリはブロックの間のみ計測する"""
+    sampler = RssSampler()
+    sampler.start()
+    try:
+        yield report
+    except BaseException as e:
+        report.finish(e, peak_memory_bytes=sampler.stop())
+        emit_report(report)
+        raise
+    report.finish(peak_memory_bytes=sampler.stop())
+    emit_report(report)
+
+
+class MeteredIO(RawIOBase):
+    """ソースのストリームを包み、読み込んだバイト数とブロックした時間をRunReportに記録する"""
+
+    def __init__(self, raw: BinaryIO, report: RunReport):
+        self._raw = raw
+        self._report = report
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return self._raw.seekable()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._raw.tell()
+
+    def peek(self, size: int = 0) -> bytes:
+        return self._raw.peek(size)  # type: ignore
+
+    def readinto(self, b) -> int:
+        start = time.perf_counter()
+        data = self._raw.read(len(b))
+        self._report.add_read(len(data), time.perf_counter() - start)
+        b[: len(data)] = data
+        return len(data)
+
+    def read(self, size: int = -1) -> bytes:
+        start = time.perf_counter()
+        data = self._raw.read(size)
+        self._report.add_read(len(data), time.perf_counter() - start)
+        return data
+
+    def close(self):
+        try:
+            self._raw.close()
+        finally:
+            super().close()
+
+
+class MeteredFormatter(FormatterInterface):
+    """フォーマッタを包み、パースしたバッチの行数と所要時間をRunReportに記録する"""
+
+    def __init__(self, formatter: FormatterInterface, report: RunReport):
+        self._formatter = formatter
+        self._report = report
+
+    def parse(self, bytes_input: BinaryIO) -> List[Dict]:
+        return self._formatter.parse(bytes_input)
+
+    def parse_frames(self, bytes_input: BinaryIO, columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+        frames = self._formatter.parse_frames(bytes_input, columns=columns)
+        while True:
+            start = time.perf_counter()
+            read_before = self._report.thread_read_seconds()
+            df = next(frames, None)
+            elapsed = time.perf_counter() - start - (self._report.thread_read_seconds() - read_before)
+            if df is None:
+                self._report.add_parse(0, elapsed)
+                return
+            self._report.add_parse(len(df), elapsed)
+            yield df
+
+
+class MeteredDBEngine:
+    """
+    DBエンジンを包み、書き込み・SQL実行とコミットの所要時間をRunReportに記録する
+    それ以外のメソッドはそのまま委譲する
+    """
+
+    # 計測するメソッドと、その呼び出しで書き込んだ行数の求め方
+    _WRITTEN_ROWS: Dict[str, Callable[[tuple, dict, Any], int]] = {
+        "insert": lambda args, kwargs, result: len(args[1] if len(args) > 1 else kwargs["data"]),
+        "upsert": lambda args, kwargs, result: len(args[1] if len(args) > 1 else kwargs["data"]),
+        "upsert_via_staging": lambda args, kwargs, result: len(args[1] if len(args) > 1 else kwargs["data"]),
+        "delete": lambda args, kwargs, result: len(args[1] if len(args) > 1 else kwargs["data"]),
+        # 作業用テーブルから反映する行は、作業用テーブルへの書き込み(PartitionedLoader)で計上済みのため含めない
+        "copy_rows": lambda args, kwargs, result: 0,
+        "truncate": lambda args, kwargs, result: 0,
+        "execute": lambda args, kwargs, result: 0,
+    }
+
+    def __init__(self, engine, report: RunReport):
+        self.engine = engine
+        self.report = report
+
+    def __enter__(self):
+        self.engine.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.engine.__exit__(exc_type, exc_value, traceback)
+
+    def commit(self):
+        start = time.perf_counter()
+        self.engine.commit()
+        self.report.add_commit(time.perf_counter() - start)
+
+    def __getattr__(self, name: str):
+        method = getattr(self.engine, name)
+        written_rows = self._WRITTEN_ROWS.get(name)
+        if written_rows is None:
+            return method
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            self.report.add_write(written_rows(args, kwargs, result), time.perf_counter() - start)
+            return result
+
+        return wrapper
@@ -1,4 +1,4 @@
-from typing import List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 
 class ColumnSchema:
@@ -20,10 +20,57 @@ class ColumnSchema:
         )
 
 
+class RowEncoder:
+    """
+    行データ(dict)を挿入対象カラム順の値リストに変換する
+
+    カラム順と、値が空文字だった場合の代替値は生成時に解決しておき、
+    変換時にはセルごとのスキーマ参照を行わない
+    代替値の解決に失敗したカラムは、実際に空文字が現れた時点でその例外を送出する
+    """
+
+    def __init__(self, column_names: Tuple[str, ...], empty_values: Tuple[Any, ...]):
+        self.column_names = column_names
+        self.empty_values = empty_values
+        self._columns = tuple(zip(column_names, empty_values))
+
+    def encode(self, row: Dict) -> List:
+        values = []
+        for col, empty_value in self._columns:
+            value = row[col]
+            if isinstance(value, str) and value == "":
+                if isinstance(empty_value, Exception):
+                    raise empty_value
+                value = empty_value
+            values.append(value)
+        return values
+
+    def encode_rows(self, rows: Iterable[Dict]) -> List[List]:
+        return [self.encode(row) for row in rows]
+
+    def encode_frame(self, df) -> List[Tuple]:
+        """DataFrameを列単位で変換し、挿入対象カラム順の値タプルのリストを返す
+        空文字の置換は列ごとにまとめて行い、行の組み立てはzipのみで行う
+        """
+        columns = []
+        for col, empty_value in self._columns:
+            series = df[col]
+            is_empty = (series == "").to_numpy(dtype=bool, na_value=False)
+            values = series.to_numpy(dtype=object, copy=True)
+            if is_empty.any():
+                if isinstance(empty_value, Exception):
+                    raise empty_value
+                values[is_empty] = empty_value
+            columns.append(values.tolist())
+        return list(zip(*columns))
+
+
 class TableSchema:
     def __init__(self, table_name: str, column_schemas: List[ColumnSchema]):
         self.name = table_name
         self.column_schemas = column_schemas
+        self._column_schemas_by_name = {s.name: s for s in column_schemas}
+        self._row_encoder: Optional[RowEncoder] = None
 
     @staticmethod
     def from_dict(data: dict) -> "TableSchema":
@@ -37,12 +84,24 @@ class TableSchema:
         return tuple(schema.name for schema in self.column_schemas)
 
     def get_column_schema(self, column_name: str) -> Optional[ColumnSchema]:
-        for s in self.column_schemas:
-            if s.name == column_name:
-                return s
-        return None
+        return self._column_schemas_by_name.get(column_name)
 
     def get_pk_column_names(self) -> Tuple[str]:
         return tuple(
             schema.name for schema in self.column_schemas if schema.is_primary_key
         )
+
+    def compile_row_encoder(self, empty_value_of: Callable[[ColumnSchema], Any]) -> RowEncoder:
+        """テーブルの全カラムを対象とするRowEncoderを生成する。生成結果はインスタンスごとに再利用する
+
+        empty_value_of: カラムスキーマを受け取り、空文字の代わりに挿入する値を返す関数
+        """
+        if self._row_encoder is None:
+            empty_values = []
+            for schema in self.column_schemas:
+                try:
+                    empty_values.append(empty_value_of(schema))
+                except Exception as e:
+                    empty_values.append(e)
+            self._row_encoder = RowEncoder(self.get_column_names(), tuple(empty_values))
+        return self._row_encoder
@@ -1,7 +1,9 @@
 from enum import Enum, auto
+from typing import Optional
 
 from tasks.data_reader import ReaderInterface
 from tasks.data_formatter import FormatterInterface
+from tasks.source_cache import ParsedSourceCache
 
 
 class DataSrc:
@@ -9,9 +11,12 @@ class DataSrc:
         self,
         location: ReaderInterface,
         formatter: FormatterInterface,
+        cache: Optional[ParsedSourceCache] = None,
     ):
         self.location = location
         self.format = formatter
+        # 指定した場合、パース結果をキャッシュし、同じソース・フォーマッタ設定ではパースを省略する
+        self.cache = cache
 
 
 class OperationTarget:
@@ -29,4 +34,20 @@ class OperationType(Enum):
     TRUNCATE = auto()
     INSERT = auto()
     UPSERT = auto()
-    DELETE = auto()
\ No newline at end of file
+    DELETE = auto()
+
+
+class InsertMethod(Enum):
+    EXECUTEMANY = auto()  # INSERT ... VALUES をexecutemanyで実行
+    LOAD_DATA = auto()  # LOAD DATA LOCAL INFILE で一括投入
+
+
+class UpsertMethod(Enum):
+    VALUES = auto()  # INSERT ... VALUES ... ON DUPLICATE KEY UPDATE で全カラムを更新
+    STAGING = auto()  # 一時テーブルに一括投入し、INSERT ... SELECT ... ON DUPLICATE KEY UPDATE でキー以外を更新
+
+
+class ReloadStrategy(Enum):
+    TRUNCATE = auto()  # 対象テーブルをTRUNCATEしてから投入する
+    SHADOW = auto()  # 同じ定義の別テーブルに投入し、RENAME TABLEで対象テーブルと入れ替える
+    INCREMENTAL = auto()  # 対象テーブルとの差分の行のみをUPSERT・DELETEする
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Iterable, List, Optional, Sequence
+
+from tasks.engines.factory import DBFactory
+from tasks.metrics import MeteredDBEngine, RunReport
+from tasks.models.operation import InsertMethod, OperationTarget
+from utils.logger import get_logger
+from utils.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+# 分割したデータを全て送り終えたことを書き込み側に伝える
+_END = object()
+
+
+class PartitionedLoader:
+    """
+    1テーブルへの大量の投入を、プライマリーキーのハッシュで分割して複数の接続から並列に書き込む
+
+    各接続は作業用テーブル(CREATE TABLE ... LIKE)に書き込み、全ての書き込みが成功した場合のみ
+    1トランザクションで対象テーブルに反映する。いずれかが失敗した場合、対象テーブルは変更されない
+    replace=Trueの場合は、反映時に対象テーブルの既存の行を全て置き換える
+    接続は対象DBの接続プールから、反映用の1本とparallelism本を同時に借りるため、parallelism + 1がプールのmax_size以下である必要がある
+    reportを指定した場合、各接続での書き込みとコミットの所要時間をreportに記録する
+    """
+
+    def __init__(
+        self,
+        target: OperationTarget,
+        parallelism: int,
+        insert_method: InsertMethod = InsertMethod.EXECUTEMANY,
+        queue_size: int = 4,
+        report: Optional[RunReport] = None,
+    ):
+        if parallelism < 1:
+            raise ValueError("parallelism must be a positive integer.")
+        self.target = target
+        self.parallelism = parallelism
+        self.insert_method = insert_method
+        self.queue_size = queue_size
+        self.report = report
+        self.logger = get_logger(__name__)
+
+    def load(self, db, data: Iterable[pd.DataFrame], replace: bool = False) -> int:
+        """dataを対象テーブルに反映し、反映した行数を返す。コミットまで行う
+
+        db: 作業用テーブルの作成と、対象テーブルへの反映に使用するエンジン
+        """
+        self._check_pool_size()
+        table_name = self.target.table_name
+        staging_table_name = db.create_staging_table(table_name)
+        self.logger.info(f"load {self.target} via {staging_table_name} over {self.parallelism} connections")
+        try:
+            loaded_rows = self.load_partitions(
+                staging_table_name,
+                db.get_table_schema(table_name).get_pk_column_names(),
+                data,
+            )
+            affected_rows = db.copy_rows(staging_table_name, table_name, replace=replace)
+            if affected_rows != loaded_rows:
+                # DROP TABLEは暗黙的にコミットするため、先にロールバックしておく
+                db.rollback()
+                raise Exception(
+                    "affected count is not matched. "
+                    f"expected: {loaded_rows}, actual: {affected_rows}"
+                )
+            db.commit()
+        finally:
+            db.drop_table(staging_table_name)
+        return affected_rows
+
+    def load_partitions(self, staging_table_name: str, pk_columns: Sequence[str], data: Iterable[pd.DataFrame]) -> int:
+        """dataを分割してstaging_table_nameに並列に書き込み、コミットする。書き込んだ行数を返す"""
+        self._check_pool_size()
+        queues: List[queue.Queue] = [queue.Queue(maxsize=self.queue_size) for _ in range(self.parallelism)]
+        errors: List[BaseException] = []
+        failed = threading.Event()
+
+        def write_partition(q: queue.Queue):
+            try:
+                engine = self._new_engine()
+                if self.report is not None:
+                    engine = MeteredDBEngine(engine, self.report)
+                with engine as db:
+                    while (df := q.get()) is not _END:
+                        db.insert(staging_table_name, df, method=self.insert_method)
+                    db.commit()
+            except BaseException as e:
+                errors.append(e)
+                failed.set()
+                # 送り手が待ち続けないよう、残りのデータを読み捨てる
+                while q.get() is not _END:
+                    pass
+
+        loaded_rows = 0
+        with ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix="partition") as executor:
+            for q in queues:
+                executor.submit(write_partition, q)
+            try:
+                for df in data:
+                    if failed.is_set():
+                        break
+                    for q, partition in zip(queues, self.partition(df, pk_columns, self.parallelism)):
+                        if len(partition) > 0:
+                            q.put(partition)
+                    loaded_rows += len(df)
+            finally:
+                for q in queues:
+                    q.put(_END)
+
+        if errors:
+            raise errors[0]
+        return loaded_rows
+
+    def _new_engine(self):
+        return DBFactory.get_engine(self.target, local_infile=self.insert_method == InsertMethod.LOAD_DATA)
+
+    def _check_pool_size(self):
+        """書き込み用のparallelism本と、呼び出し元が保持する1本を同時に借りられるか確認する
+        借りられないと、接続を待つ書き込み側のキューが埋まって送り手も停止し、acquire_timeoutまで進まなくなるため
+        """
+        pool = getattr(self._new_engine(), "pool", None)
+        if pool is not None and self.parallelism + 1 > pool.max_size:
+            raise ValueError(
+                f"parallelism ({self.parallelism}) + 1 exceeds the connection pool max_size ({pool.max_size}). "
+                "lower parallelism or raise max_size with configure_connection_pools or [mysql_pool] in config."
+            )
+
+    @staticmethod
+    def partition(df: pd.DataFrame, pk_columns: Sequence[str], n: int) -> List[pd.DataFrame]:
+        """プライマリーキーのハッシュでn個に分割する。プライマリーキーがない場合は行番号で分割する"""
+        if pk_columns:
+            keys = pd.util.hash_pandas_object(df[list(pk_columns)], index=False).to_numpy() % n
+        else:
+            keys = np.arange(len(df)) % n
+        return [df[keys == i] for i in range(n)]
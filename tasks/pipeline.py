@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import queue
+import threading
+from io import BufferedReader, RawIOBase
+from typing import TYPE_CHECKING, Any, BinaryIO, Iterator, Optional, Sequence
+
+from tasks.data_formatter import FormatterInterface
+from tasks.data_reader import MultiObjectSource
+from utils.logger import get_logger
+from utils.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+# 上流の段が全てのデータを送り終えたことを表す
+_END = object()
+
+
+class _Failure:
+    """上流の段で発生した例外を下流に伝えるための入れ物"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class _Stopped(Exception):
+    """パイプラインの停止を各段に知らせるための例外"""
+
+
+class PipelinedSource:
+    """
+    ソースの読み込みとパースをそれぞれ別スレッドで実行し、呼び出し元での書き込みと並行に進める
+
+    読み込み → [バイト列のキュー] → パース → [DataFrameのキュー] → 書き込み(イテレーションする側)
+    キューはqueue_size個までで、下流が詰まると上流は待機する(バックプレッシャー)
+    上流の段で発生した例外は下流に伝播し、イテレーション時に送出される
+    withブロックを抜けると各段を停止し、スレッドの終了を待つ
+    MultiObjectSourceの場合、オブジェクトの取得は既に並列に行われるため、読み込み段を設けずにパース段から読み込む
+    """
+
+    def __init__(
+        self,
+        bytes_input: BinaryIO,
+        formatter: FormatterInterface,
+        columns: Optional[Sequence[str]] = None,
+        queue_size: int = 4,
+        block_size: int = 1024 * 1024,
+    ):
+        if queue_size < 1:
+            raise ValueError("queue_size must be a positive integer.")
+        self.logger = get_logger(__name__)
+        self._bytes_input = bytes_input
+        self._formatter = formatter
+        self._columns = columns
+        self._block_size = block_size
+        self._raw_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._frame_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._parse_stage, name="pipeline-parse", daemon=True)]
+        if not isinstance(bytes_input, MultiObjectSource):
+            self._threads.append(threading.Thread(target=self._read_stage, name="pipeline-read", daemon=True))
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        while True:
+            item = self._get(self._frame_queue)
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+
+    def _read_stage(self):
+        try:
+            while True:
+                block = self._bytes_input.read(self._block_size)
+                if not block:
+                    break
+                self._put(self._raw_queue, block)
+            self._put(self._raw_queue, _END)
+        except _Stopped:
+            return
+        except BaseException as e:
+            self._put_failure(self._raw_queue, e)
+
+    def _parse_stage(self):
+        try:
+            if isinstance(self._bytes_input, MultiObjectSource):
+                frames = self._formatter.parse_parts(self._bytes_input, columns=self._columns)
+            else:
+                stream = BufferedReader(_QueueIO(self), buffer_size=self._block_size)
+                frames = self._formatter.parse_frames(stream, columns=self._columns)
+            for df in frames:
+                self._put(self._frame_queue, df)
+            self._put(self._frame_queue, _END)
+        except _Stopped:
+            return
+        except BaseException as e:
+            self._put_failure(self._frame_queue, e)
+
+    def _put(self, q: queue.Queue, item: Any):
+        """キューに空きができるまで待って追加する。停止された場合は_Stoppedを送出する"""
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _put_failure(self, q: queue.Queue, error: BaseException):
+        try:
+            self._put(q, _Failure(error))
+        except _Stopped:
+            self.logger.debug(f"pipeline stopped before propagating: {error!r}")
+
+    def _get(self, q: queue.Queue) -> Any:
+        """キューから取り出せるまで待つ。停止された場合は_Stoppedを送出する"""
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+
+class _QueueIO(RawIOBase):
+    """読み込み段から受け取ったバイト列を、パース段にファイルライクオブジェクトとして渡すアダプタ"""
+
+    def __init__(self, pipeline: PipelinedSource):
+        self._pipeline = pipeline
+        self._buffer = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            if self._eof:
+                return 0
+            item = self._pipeline._get(self._pipeline._raw_queue)
+            if item is _END:
+                self._eof = True
+                return 0
+            if isinstance(item, _Failure):
+                raise item.error
+            self._buffer = memoryview(item)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+
+from tasks.file_cache import FileCache
+
+
+class S3ObjectCache(FileCache):
+    """
+    S3オブジェクトをローカルディスクにキャッシュする
+
+    キャッシュのキーはバケット・キー・ETagで、head_objectで取得した現在のETagと一致するものだけを有効とする
+    オブジェクトが更新されるとETagが変わるため、古いキャッシュは参照されなくなり、LRUで削除される
+    """
+
+    _CHUNK_SIZE = 8 * 1024 * 1024
+
+    def fetch(self, client, bucket_name: str, key: str) -> Path:
+        """オブジェクトの現在のETagに対応するキャッシュファイルのパスを返す。なければダウンロードして格納する"""
+        etag = client.head_object(Bucket=bucket_name, Key=key)["ETag"]
+        path = self.path_for(bucket_name, key, etag)
+        if self.touch(path):
+            self.logger.info(f"cache hit s3://{bucket_name}/{key} ({etag})")
+            return path
+
+        with self.fill_lock(path):
+            # ロックを待つ間に別のプロセスが格納した場合はそれを使う
+            if self.touch(path):
+                self.logger.info(f"cache hit s3://{bucket_name}/{key} ({etag})")
+                return path
+            self.logger.info(f"cache miss s3://{bucket_name}/{key} ({etag})")
+            self._download(client, bucket_name, key, etag, path)
+        self.evict(keep=path)
+        return path
+
+    def path_for(self, bucket_name: str, key: str, etag: str) -> Path:
+        return self.entry_path(bucket_name, key, etag)
+
+    def _download(self, client, bucket_name: str, key: str, etag: str, path: Path):
+        # 取得中にオブジェクトが更新された場合に、別の内容を古いETagで格納しないようIfMatchを指定する
+        body = client.get_object(Bucket=bucket_name, Key=key, IfMatch=etag)["Body"]
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: body.read(self._CHUNK_SIZE), b""):
+                    f.write(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
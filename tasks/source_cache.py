@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from tasks.data_formatter import FormatterInterface, ParquetFormatter
+from tasks.data_reader import LocalReader, ReaderInterface
+from tasks.file_cache import FileCache
+from utils.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import fastparquet
+    import pandas as pd
+else:
+    fastparquet = lazy_import("fastparquet")
+    pd = lazy_import("pandas")
+
+
+class ParsedSourceCache(FileCache):
+    """
+    ソースをパース・正規化した結果を、Parquet形式でローカルディスクにキャッシュする
+
+    キャッシュのキーはReaderInterface.fingerprintとフォーマッタの種類・FormatterInterface.cache_settingsで、
+    いずれかがNoneのソースはキャッシュしない
+    カラムを絞り込んで読み込めるフォーマッタ(ParquetFormatter等)は、読み込むカラムのみをパース・キャッシュし、キーにもカラムを含める
+    このため同じソースでも読み込むカラムが異なる場合(DELETEとINSERT等)は別のキャッシュとなる
+    キャッシュがある場合は、ソースを読み込まずにキャッシュファイルをメモリマップしてParquetFormatterで読み込む
+    ない場合は、パースしたバッチをそのまま返しながらキャッシュファイルに書き込み、全て読み終えた時点で格納する
+    キャッシュにはROW_GROUP_SIZE行ずつの行グループとして書き込み、読み込み時はフォーマッタのchunk_size行ずつに
+    区切り直して返す(chunk_sizeがない場合は行グループ単位で返す)。キャッシュを作成した時のバッチの区切りにはよらない
+    """
+
+    SUFFIX = ".parquet"
+    ROW_GROUP_SIZE = 100_000
+
+    def open(
+        self,
+        location: ReaderInterface,
+        formatter: FormatterInterface,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Tuple[BinaryIO, FormatterInterface]:
+        """ソースを開き、そのストリームとパースに使用するフォーマッタを返す
+
+        columns: 読み込むカラム名。返したフォーマッタのparse_framesにも同じカラムを指定すること
+        """
+        columns = list(columns) if columns is not None and formatter.projects_columns else None
+        key = self.key(location, formatter, columns)
+        if key is None:
+            return location.read(), formatter
+        path = self.entry_path(key)
+        if self.touch(path):
+            self.logger.info(f"parsed cache hit {path.name}")
+            formatter = _CachedFormatter(getattr(formatter, "chunk_size", None))
+            return LocalReader(str(path), use_mmap=True, compression=None).read(), formatter
+        self.logger.info(f"parsed cache miss {path.name}")
+        return location.read(), _CachingFormatter(formatter, self, path, columns)
+
+    def key(
+        self,
+        location: ReaderInterface,
+        formatter: FormatterInterface,
+        columns: Optional[List[str]] = None,
+    ) -> Optional[str]:
+        fingerprint = location.fingerprint()
+        settings = formatter.cache_settings()
+        if fingerprint is None or settings is None:
+            return None
+        return json.dumps([fingerprint, type(formatter).__name__, settings, columns], sort_keys=True)
+
+
+class _CachedFormatter(ParquetFormatter):
+    """キャッシュファイルを読み込み、chunk_size行ずつのバッチに区切り直して返す"""
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        super().__init__()
+        self.chunk_size = chunk_size
+
+    def parse_frames(self, bytes_input: BinaryIO, columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+        frames = super().parse_frames(bytes_input, columns=columns)
+        if self.chunk_size is None:
+            yield from frames
+            return
+
+        buffer: List[pd.DataFrame] = []
+        buffered_rows = 0
+        for df in frames:
+            start = 0
+            while start < len(df):
+                end = min(len(df), start + self.chunk_size - buffered_rows)
+                buffer.append(df.iloc[start:end])
+                buffered_rows += end - start
+                start = end
+                if buffered_rows == self.chunk_size:
+                    yield pd.concat(buffer, ignore_index=True)
+                    buffer, buffered_rows = [], 0
+        if buffer:
+            yield pd.concat(buffer, ignore_index=True)
+
+
+class _CachingFormatter(FormatterInterface):
+    """フォーマッタを包み、parse_framesで返したバッチをキャッシュファイルに書き込む"""
+
+    def __init__(
+        self,
+        formatter: FormatterInterface,
+        cache: ParsedSourceCache,
+        path: Path,
+        columns: Optional[List[str]] = None,
+    ):
+        self._formatter = formatter
+        self._cache = cache
+        self._path = path
+        # キャッシュのキーに含めたカラム。Noneの場合は全カラムをパース・キャッシュする
+        self._columns = columns
+
+    def parse(self, bytes_input: BinaryIO) -> List[Dict[Any, Any]]:
+        return self._formatter.parse(bytes_input)
+
+    def parse_frames(self, bytes_input: BinaryIO, columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+        """キャッシュのキーと内容を一致させるため、columnsではなくParsedSourceCache.openに指定したカラムでパースする"""
+        fd, temp_path = tempfile.mkstemp(dir=self._cache.directory, suffix=".tmp")
+        os.close(fd)
+        row_group_size = self._cache.ROW_GROUP_SIZE
+        # 行グループの大きさを揃えるため、ROW_GROUP_SIZE行に達するまでバッチを溜めてから書き込む
+        pending: List[pd.DataFrame] = []
+        pending_rows = 0
+        writable, written = True, False
+
+        def write(frames: List[pd.DataFrame]):
+            nonlocal writable, written
+            if not writable or not frames:
+                return
+            try:
+                df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+                offsets = list(range(0, len(df), row_group_size))
+                fastparquet.write(temp_path, df, row_group_offsets=offsets, append=written, write_index=False)
+                written = True
+            except Exception as e:
+                # バッチ間で型が揃わない等で書き込めない場合は、キャッシュせずにパースを続ける
+                self._cache.logger.warning(f"give up caching parsed source: {e!r}")
+                writable = False
+
+        try:
+            for df in self._formatter.parse_frames(bytes_input, columns=self._columns):
+                if writable:
+                    pending.append(df)
+                    pending_rows += len(df)
+                    if pending_rows >= row_group_size:
+                        # 行グループに満たない末尾は次のバッチと合わせて書き込む
+                        rows = pd.concat(pending, ignore_index=True)
+                        full_rows = pending_rows - pending_rows % row_group_size
+                        write([rows.iloc[:full_rows]])
+                        pending = [rows.iloc[full_rows:]] if full_rows < pending_rows else []
+                        pending_rows -= full_rows
+                yield df
+            write(pending)
+            if writable and written:
+                os.replace(temp_path, self._path)
+                self._cache.evict(keep=self._path)
+        finally:
+            Path(temp_path).unlink(missing_ok=True)
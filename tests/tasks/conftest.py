@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from tasks.models.model import ColumnSchema, TableSchema
+
+CITY_COLUMNS = ("ID", "Name", "CountryCode", "District", "Population")
+
+
+class RecordingEngine:
+    """呼び出されたメソッドを記録するエンジン"""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.calls.append(("exit", exc_type))
+
+    def get_table_schema(self, table_name):
+        return TableSchema(
+            table_name,
+            [ColumnSchema(c, 253, False, c == "ID") for c in CITY_COLUMNS],
+        )
+
+    def truncate(self, table_name):
+        self.calls.append(("truncate", table_name))
+
+    def insert(self, table_name, data, method=None):
+        self.calls.append(("insert", table_name, len(data)))
+
+    def commit(self):
+        self.calls.append(("commit",))
+
+
+@pytest.fixture
+def recording_engine():
+    """DBFactory.get_engineを、cityテーブルへの呼び出しを記録するエンジンに差し替え、記録先のリストを返す"""
+    calls = []
+    with patch("tasks.engines.factory.DBFactory.get_engine", lambda *args, **kwargs: RecordingEngine(calls)):
+        yield calls
+
+
+class DiffingEngine(RecordingEngine):
+    """テーブルの行を保持し、作業用テーブルに投入された行との差分を返すエンジン。差分の書き込みを記録する"""
+
+    def __init__(self, calls, rows):
+        super().__init__(calls)
+        self.rows = {row[0]: tuple(row) for row in rows}
+        self.staged = {}
+
+    def get_table_schema(self, table_name):
+        return TableSchema(table_name, [ColumnSchema(c, 253, c != "ID", c == "ID") for c in CITY_COLUMNS])
+
+    def create_staging_table(self, table_name, temporary=False):
+        return f"{table_name}__stg"
+
+    def insert_into_staging(self, staging_table_name, table_name, data, method=None):
+        encoder = self.get_table_schema(table_name).compile_row_encoder(lambda s: None if s.is_nullable else "")
+        for values in encoder.encode_frame(data):
+            self.staged[values[0]] = tuple(values)
+
+    def get_missing_keys(self, table_name, staging_table_name):
+        return pd.DataFrame({"ID": [k for k in self.rows if k not in self.staged]}, dtype=object)
+
+    def get_changed_rows(self, table_name, staging_table_name):
+        rows = [values for key, values in self.staged.items() if self.rows.get(key) != values]
+        return pd.DataFrame(rows, columns=list(CITY_COLUMNS), dtype=object)
+
+    def delete(self, table_name, data):
+        self.calls.append(("delete", table_name, list(data["ID"])))
+
+    def upsert(self, table_name, data):
+        self.calls.append(("upsert", table_name, list(data["ID"])))
+
+    def drop_table(self, table_name, temporary=False):
+        self.calls.append(("drop", table_name, temporary))
+
+
+@pytest.fixture
+def diffing_engine():
+    """rows(cityテーブルの行)を保持するDiffingEngineを生成する関数を返す
+    DBFactory.get_engineは、最後に生成したエンジンを返すよう差し替える
+    """
+    engines = []
+
+    def create(rows):
+        engines.append(DiffingEngine([], rows))
+        return engines[-1]
+
+    with patch("tasks.engines.factory.DBFactory.get_engine", lambda *args, **kwargs: engines[-1]):
+        yield create
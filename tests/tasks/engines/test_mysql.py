@@ -0,0 +1,222 @@
+import pytest
+from unittest.mock import patch
+
+import pymysql
+
+from tasks.engines.mysql import MySQLEngine
+from tasks.engines.pool import close_connection_pools
+from tasks.models.model import ColumnSchema, TableSchema
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._result = None
+
+    def mogrify(self, query, args=None):
+        if args is None:
+            return query
+        return query % tuple(pymysql.converters.escape_item(a, "utf8") for a in args)
+
+    def execute(self, query, args=None):
+        if isinstance(query, str) and "@@max_allowed_packet" in query:
+            self._result = {"max_allowed_packet": self.connection.max_allowed_packet}
+            return 1
+        if isinstance(query, str):
+            query = query.encode()
+        self.connection.queries.append(query)
+        if self.connection.broken or b"missing" in query:
+            raise pymysql.err.ProgrammingError(1146, "Table 'dev.missing' doesn't exist")
+        return query.count(b"),(") + 1
+
+    def fetchone(self):
+        return self._result
+
+    def fetchall(self):
+        return []
+
+
+class FakeConnection:
+    encoding = "utf8"
+    open = True
+    broken = False
+
+    def __init__(self, max_allowed_packet):
+        self.max_allowed_packet = max_allowed_packet
+        self.queries = []
+        self.commit_count = 0
+
+    def close(self):
+        self.open = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commit_count += 1
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def engine_factory():
+    def factory(max_allowed_packet, **options):
+        connection = FakeConnection(max_allowed_packet)
+        connect.return_value = connection
+        engine = MySQLEngine("dev", access_info={}, **options)  # type: ignore
+        engine.get_table_schema = lambda table_name: TableSchema(  # type: ignore
+            table_name,
+            [
+                ColumnSchema("ID", pymysql.FIELD_TYPE.LONG, is_nullable=False, is_primary_key=True),
+                ColumnSchema("Name", pymysql.FIELD_TYPE.STRING, is_nullable=False, is_primary_key=False),
+            ],
+        )
+        return engine, connection
+
+    with patch("tasks.engines.mysql.pymysql.connect") as connect:
+        yield factory
+    close_connection_pools()
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_max_allowed_packetに応じた分割(engine_factory):
+    engine, connection = engine_factory(max_allowed_packet=1024 + 120)
+    data = [{"ID": str(i), "Name": f"name_{i:03}"} for i in range(10)]
+
+    with engine as db:
+        affected_rows = db.insert("city", data)
+
+    # 全ての文がmax_allowed_packetに収まり、影響行数は全ての文の合計になる
+    assert affected_rows == 10
+    assert len(connection.queries) > 1
+    assert all(len(q) <= 120 for q in connection.queries)
+    assert b"".join(connection.queries).count(b"'name_") == 10
+    assert connection.commit_count == 0
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_分割した文ごとのコミット(engine_factory):
+    engine, connection = engine_factory(max_allowed_packet=1024 + 120, commit_per_chunk=True)
+    data = [{"ID": str(i), "Name": f"name_{i:03}"} for i in range(10)]
+
+    with engine as db:
+        db.insert("city", data)
+
+    assert connection.commit_count == len(connection.queries)
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_削除するキーをINにまとめる(engine_factory, monkeypatch):
+    engine, connection = engine_factory(max_allowed_packet=1024 * 1024)
+    monkeypatch.setattr(MySQLEngine, "_DELETE_BATCH_SIZE", 4)
+    data = [{"ID": str(i), "Name": ""} for i in range(10)]
+
+    with engine as db:
+        affected_rows = db.delete("city", data)
+
+    assert affected_rows == 10
+    assert [q.strip() for q in connection.queries] == [
+        b"DELETE FROM city WHERE (ID) IN (('0'),('1'),('2'),('3'))",
+        b"DELETE FROM city WHERE (ID) IN (('4'),('5'),('6'),('7'))",
+        b"DELETE FROM city WHERE (ID) IN (('8'),('9'))",
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_一時テーブルを経由したUPSERT(engine_factory):
+    engine, connection = engine_factory(max_allowed_packet=1024 * 1024)
+    data = [{"ID": str(i), "Name": f"name_{i}"} for i in range(3)]
+
+    with engine as db:
+        db.upsert_via_staging("city", data)
+
+    queries = [b" ".join(q.split()) for q in connection.queries]
+    assert queries[0].startswith(b"CREATE TEMPORARY TABLE city__stg_")
+    assert queries[1].startswith(b"INSERT INTO city__stg_")
+    assert queries[2].startswith(b"INSERT INTO city (ID,Name) SELECT * FROM (SELECT ID,Name FROM city__stg_")
+    # プライマリーキー以外のカラムのみ更新する
+    assert queries[2].endswith(b"AS r ON DUPLICATE KEY UPDATE Name=r.Name")
+    assert queries[3].startswith(b"DROP TEMPORARY TABLE IF EXISTS city__stg_")
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_作業用テーブルとの差分はカラムの型のまま比較する(engine_factory):
+    engine, connection = engine_factory(max_allowed_packet=1024 * 1024)
+
+    with engine as db:
+        changed = db.get_changed_rows("city", "city__stg")
+        deleted = db.get_missing_keys("city", "city__stg")
+
+    assert list(changed.columns) == ["ID", "Name"] and len(changed) == 0
+    assert list(deleted.columns) == ["ID"] and len(deleted) == 0
+    queries = [b" ".join(q.split()) for q in connection.queries]
+    # キーや値を文字列に変換せず、サーバ側で型のまま突き合わせる
+    assert queries == [
+        b"SELECT s.ID,s.Name FROM city__stg AS s LEFT JOIN city AS t ON s.ID = t.ID "
+        b"WHERE t.ID IS NULL OR NOT (s.ID <=> t.ID AND s.Name <=> t.Name)",
+        b"SELECT t.ID FROM city AS t LEFT JOIN city__stg AS s ON s.ID = t.ID WHERE s.ID IS NULL",
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_TRUNCATEに失敗しても外部キーのチェックを戻す(engine_factory):
+    engine, connection = engine_factory(max_allowed_packet=1024 * 1024)
+
+    with pytest.raises(pymysql.err.ProgrammingError):
+        with engine as db:
+            db.truncate("missing")
+
+    assert connection.queries[-1] == b"SET SESSION FOREIGN_KEY_CHECKS=1"
+    # セッションを元に戻せた接続はプールに返して再利用する
+    assert connection.open
+    with MySQLEngine("dev", access_info={}) as db:  # type: ignore
+        assert db.connection is connection
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_外部キーのチェックを戻せない接続は破棄する(engine_factory):
+    engine, connection = engine_factory(max_allowed_packet=1024 * 1024)
+
+    with pytest.raises(pymysql.err.ProgrammingError):
+        with engine as db:
+            with db._foreign_key_checks_disabled():
+                connection.broken = True
+
+    assert not connection.open
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_設定ファイルの接続プール設定(engine_factory, tmp_path):
+    from utils.config import set_config_path
+
+    config_path = tmp_path / "config.toml"
+    config_path.write_text('[mysql]\nhost = "localhost"\n\n[mysql_pool]\nmax_size = 2\nacquire_timeout = 5\n')
+    set_config_path(str(config_path))
+    try:
+        engine = MySQLEngine("pool_options")
+    finally:
+        set_config_path(None)
+    assert (engine.pool.max_size, engine.pool.acquire_timeout) == (2, 5)
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_指定した設定ファイルがない場合(engine_factory, tmp_path):
+    from utils.config import set_config_path
+
+    # 接続情報を指定していても、パスの誤りで接続プール設定を黙って無視しない
+    set_config_path(str(tmp_path / "missing.toml"))
+    try:
+        with pytest.raises(FileNotFoundError):
+            MySQLEngine("dev", access_info={})  # type: ignore
+    finally:
+        set_config_path(None)
@@ -0,0 +1,98 @@
+import pytest
+
+from tasks.engines.pool import ConnectionPool, close_connection_pools, configure_connection_pools, get_connection_pool
+
+
+class FakeConnection:
+    def __init__(self, alive=True):
+        self.open = True
+        self.alive = alive
+        self.rollback_count = 0
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise ConnectionError()
+
+    def rollback(self):
+        self.rollback_count += 1
+
+    def close(self):
+        self.open = False
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("tasks.engines.pool.time.monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_接続の再利用(clock):
+    created = []
+    pool = ConnectionPool(lambda: created.append(FakeConnection()) or created[-1], max_size=2)
+
+    conn = pool.acquire()
+    pool.release(conn)
+    # 返却時にロールバックし、同じ接続を再利用する
+    assert conn.rollback_count == 1
+    assert pool.acquire() is conn
+    # 貸出中の接続しかない場合は新たに接続する
+    assert pool.acquire() is not conn
+    assert len(created) == 2
+
+    # 上限に達した場合は返却を待ち、タイムアウトする
+    pool.acquire_timeout = 0.01
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_死活確認とアイドル接続の破棄(clock):
+    created = []
+    pool = ConnectionPool(
+        lambda: created.append(FakeConnection()) or created[-1],
+        idle_timeout=600,
+        health_check_interval=60,
+    )
+
+    # health_check_intervalを超えた接続は死活確認し、応答がなければ作り直す
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.alive = False
+    clock[0] += 61
+    new_conn = pool.acquire()
+    assert new_conn is not conn
+    assert not conn.open
+
+    # idle_timeoutを超えた接続は閉じる
+    pool.release(new_conn)
+    clock[0] += 601
+    assert pool.acquire() is not new_conn
+    assert not new_conn.open
+
+    # discard指定で返却した接続は再利用しない
+    conn = pool.acquire()
+    pool.release(conn, discard=True)
+    assert not conn.open
+    assert pool.acquire() is not conn
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_接続プールの設定(monkeypatch):
+    monkeypatch.setattr("tasks.engines.pool._pool_options", {})
+    close_connection_pools()
+
+    # 呼び出し側の既定値より、configure_connection_poolsの指定を優先する
+    configure_connection_pools(max_size=3, acquire_timeout=1)
+    pool = get_connection_pool("options", FakeConnection, max_size=8, idle_timeout=30)
+    assert (pool.max_size, pool.acquire_timeout, pool.idle_timeout) == (3, 1, 30)
+    close_connection_pools()
+
+    with pytest.raises(ValueError):
+        configure_connection_pools(min_size=1)
+    with pytest.raises(ValueError):
+        configure_connection_pools(max_size=0)
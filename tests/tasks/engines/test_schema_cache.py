@@ -0,0 +1,35 @@
+import pytest
+
+from tasks.engines.schema_cache import TableSchemaCache
+from tasks.models.model import TableSchema
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_スキーマキャッシュの有効期限と無効化(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("tasks.engines.schema_cache.time.monotonic", lambda: now)
+    cache = TableSchemaCache(ttl=60)
+    city = TableSchema("city", [])
+    country = TableSchema("country", [])
+    cache.set("dev", "city", city)
+    cache.set("dev", "country", country)
+
+    # 有効期限内はキャッシュを返す
+    now = 1060.0
+    assert cache.get("dev", "city") is city
+    assert cache.get("other", "city") is None
+
+    # テーブル単位の無効化
+    cache.invalidate("dev", "city")
+    assert cache.get("dev", "city") is None
+    assert cache.get("dev", "country") is country
+
+    # 有効期限切れ
+    now = 1061.0
+    assert cache.get("dev", "country") is None
+
+    # 全体の無効化
+    cache.set("dev", "city", city)
+    cache.invalidate()
+    assert cache.get("dev", "city") is None
@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from tasks.models.model import ColumnSchema, TableSchema
+
+
+def _empty_value_of(column_schema: ColumnSchema):
+    if column_schema.data_type == "json":
+        raise Exception("data_type: json is not supported")
+    return None if column_schema.is_nullable else "0"
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_行エンコーダ():
+    table_schema = TableSchema(
+        "t",
+        [
+            ColumnSchema("id", "long", is_nullable=False, is_primary_key=True),
+            ColumnSchema("name", "var_string", is_nullable=True, is_primary_key=False),
+            ColumnSchema("attrs", "json", is_nullable=False, is_primary_key=False),
+        ],
+    )
+    encoder = table_schema.compile_row_encoder(_empty_value_of)
+
+    # カラム順に並べ替え、空文字はカラムごとの代替値に置換する。余分なカラムは無視する
+    assert encoder.encode_rows([
+        {"name": "Alice", "id": "1", "attrs": "{}", "extra": "x"},
+        {"name": "", "id": "", "attrs": "{}"},
+    ]) == [
+        ["1", "Alice", "{}"],
+        ["0", None, "{}"],
+    ]
+    # エンコーダは再利用される
+    assert table_schema.compile_row_encoder(_empty_value_of) is encoder
+
+    # 代替値を解決できないカラムは、空文字が現れた時点でエラーになる
+    with pytest.raises(Exception, match="json is not supported"):
+        encoder.encode({"id": "1", "name": "Alice", "attrs": ""})
+
+    # 必要なカラムが欠けている場合
+    with pytest.raises(KeyError):
+        encoder.encode({"id": "1"})
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_行エンコーダ_DataFrame():
+    table_schema = TableSchema(
+        "t",
+        [
+            ColumnSchema("id", "long", is_nullable=False, is_primary_key=True),
+            ColumnSchema("name", "var_string", is_nullable=True, is_primary_key=False),
+        ],
+    )
+    encoder = table_schema.compile_row_encoder(_empty_value_of)
+    rows = [
+        {"name": "Alice", "id": "1", "extra": "x"},
+        {"name": "", "id": "", "extra": "y"},
+    ]
+
+    # 行単位で変換した場合と同じ値になる
+    res = encoder.encode_frame(pd.DataFrame.from_records(rows))
+    assert res == [("1", "Alice"), ("0", None)]
+    assert [list(r) for r in res] == encoder.encode_rows(rows)
+
+    # 必要なカラムが欠けている場合
+    with pytest.raises(KeyError):
+        encoder.encode_frame(pd.DataFrame({"id": ["1"]}))
@@ -0,0 +1,134 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from tasks.aio import run_tasks_async
+from tasks.etl_task import DMLTask
+from tasks.data_formatter import CSVFormatter
+from tasks.data_reader import LocalReader
+from tasks.models.operation import DataSrc, OperationTarget, OperationType, ReloadStrategy
+from tasks.pipeline import PipelinedSource
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_非同期実行(recording_engine):
+    calls = recording_engine
+    tasks = [
+        DMLTask(
+            target=OperationTarget("mysql", "dev", "city"),
+            operaton=OperationType.RELOAD,
+            source=DataSrc(LocalReader("tests/data/mysql/csv/city.csv"), CSVFormatter(chunk_size=15)),
+        ),
+        DMLTask(
+            target=OperationTarget("mysql", "dev", "city"),
+            operaton=OperationType.INSERT,
+            source=DataSrc(
+                LocalReader("tests/data/mysql/csv/normal/03_city_no_header.csv"),
+                CSVFormatter(has_header=False, column_names=["ID", "Name", "CountryCode", "District", "Population"]),
+            ),
+        ),
+    ]
+
+    asyncio.run(run_tasks_async(tasks, max_concurrency=1))
+
+    assert calls == [
+        ("truncate", "city"),
+        ("insert", "city", 15),
+        ("insert", "city", 5),
+        ("commit",),
+        ("exit", None),
+        ("insert", "city", 3),
+        ("commit",),
+        ("exit", None),
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_非同期実行_パースエラー(recording_engine):
+    calls = recording_engine
+    task = DMLTask(
+        target=OperationTarget("mysql", "dev", "city"),
+        operaton=OperationType.RELOAD,
+        source=DataSrc(
+            LocalReader("tests/data/mysql/csv/normal/03_city_no_header.csv"),
+            CSVFormatter(has_header=False, column_names=None),
+        ),
+    )
+
+    with pytest.raises(ValueError):
+        asyncio.run(task.run_async())
+
+    # パース設定の誤りはTRUNCATEより前に検出される
+    assert calls == [("exit", ValueError)]
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_非同期実行_並列投入(recording_engine):
+    calls = recording_engine
+    loaded = []
+    task = DMLTask(
+        target=OperationTarget("mysql", "dev", "city"),
+        operaton=OperationType.RELOAD,
+        source=DataSrc(LocalReader("tests/data/mysql/csv/city.csv"), CSVFormatter(chunk_size=15)),
+        parallelism=4,
+    )
+
+    def load(self, db, data, replace=False):
+        loaded.append((self.parallelism, replace, sum(len(df) for df in data)))
+
+    with patch("tasks.parallel_load.PartitionedLoader.load", load):
+        asyncio.run(task.run_async())
+
+    # 並列投入はrunと同じくPartitionedLoaderで行う
+    assert loaded == [(4, True, 20)]
+    assert calls == [("exit", None)]
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_非同期実行_パイプライン(recording_engine):
+    calls = recording_engine
+    task = DMLTask(
+        target=OperationTarget("mysql", "dev", "city"),
+        operaton=OperationType.INSERT,
+        source=DataSrc(LocalReader("tests/data/mysql/csv/city.csv"), CSVFormatter(chunk_size=15)),
+        pipelined=True,
+        queue_size=1,
+    )
+
+    with patch("tasks.etl_task.PipelinedSource", wraps=PipelinedSource) as pipeline:
+        asyncio.run(task.run_async())
+
+    # pipelined・queue_sizeはrunと同じく扱われる
+    assert pipeline.call_args.kwargs["queue_size"] == 1
+    assert calls == [("insert", "city", 15), ("insert", "city", 5), ("commit",), ("exit", None)]
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_非同期実行_差分投入(diffing_engine):
+    with LocalReader("tests/data/mysql/csv/city.csv").read() as stream:
+        # 空文字はNULLとして投入された状態
+        rows = [tuple(v if v != "" else None for v in row.values()) for row in CSVFormatter().parse(stream)]
+    # ID=1の行を変更し、ID=2の行を削除し、ソースにないID=99の行を追加した状態
+    db = diffing_engine([("1", "Kabul", "AFG", "Kabol", "0")] + rows[2:] + [("99", "x", "x", "x", "0")])
+    task = DMLTask(
+        target=OperationTarget("mysql", "dev", "city"),
+        operaton=OperationType.RELOAD,
+        source=DataSrc(LocalReader("tests/data/mysql/csv/city.csv"), CSVFormatter(chunk_size=15)),
+        reload_strategy=ReloadStrategy.INCREMENTAL,
+    )
+
+    asyncio.run(task.run_async())
+
+    assert db.calls == [
+        ("delete", "city", ["99"]),
+        ("upsert", "city", ["1", "2"]),
+        ("commit",),
+        ("drop", "city__stg", True),
+        ("exit", None),
+    ]
@@ -3,7 +3,7 @@ import pytest
 from textwrap import dedent
 from io import BytesIO
 
-from tasks.data_formatter import CSVFormatter
+from tasks.data_formatter import CSVFormatter, ParquetFormatter
 
 @pytest.mark.unit
 @pytest.mark.normal
@@ -101,3 +101,50 @@ def test_csv_format_ヘッダなし():
         {"name": "Bob", "age": "40", "gender": "male"},
         {"name": "", "age": "0", "gender": "unknown"},
     ]
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_csv_format_チャンク分割():
+    # 準備
+    s = dedent(
+        """\
+    "name","age","gender"
+    "Alice",30,"female"
+    "Bob",40,"male"
+    ,,
+    "",0,"unknown"
+    """
+    )
+
+    # 実行
+    fmt = CSVFormatter(
+        encoding="utf-8",
+        has_header=True,
+        column_names=None,
+        chunk_size=2,
+    )
+    res = list(fmt.parse_batches(
+        bytes_input=BytesIO(s.encode("utf-8")),
+    ))
+
+    # 確認
+    assert res == [
+        [
+            {"name": "Alice", "age": "30", "gender": "female"},
+            {"name": "Bob", "age": "40", "gender": "male"},
+        ],
+        [
+            {"name": "", "age": "0", "gender": "unknown"},
+        ],
+    ]
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_parquet_format_カラム指定():
+    # 実行
+    with open("tests/data/mysql/parquet/country.parquet", "rb") as f:
+        frames = list(ParquetFormatter().parse_frames(f, columns=["Code", "Name", "NotInFile"]))
+
+    # 確認: ファイルに存在する指定カラムのみ読み込む
+    assert [df.columns.tolist() for df in frames] == [["Code", "Name"]]
+    assert frames[0].iloc[0].to_dict() == {"Code": "AFG", "Name": "Afghanistan"}
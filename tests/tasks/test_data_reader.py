@@ -0,0 +1,199 @@
+import asyncio
+
+import pytest
+from moto import mock_s3
+import boto3
+
+from tasks.data_reader import AWSS3PrefixReader, AWSS3Reader, LocalReader
+from tasks.data_formatter import CSVFormatter, ParquetFormatter
+from tasks.etl_task import DMLTask
+from tasks.models.operation import DataSrc, OperationTarget, OperationType
+
+
+@pytest.fixture
+def s3_objects():
+    with mock_s3():
+        s3 = boto3.resource("s3")
+        s3.create_bucket(Bucket="mybucket")  # type: ignore
+        s3.Object("mybucket", "country.parquet").put(Body=open("tests/data/mysql/parquet/country.parquet", "rb"))  # type: ignore
+        s3.Object("mybucket", "csv/city.csv").put(Body=open("tests/data/mysql/csv/city.csv", "rb"))  # type: ignore
+        yield s3
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+@pytest.mark.parametrize(
+    "reader",
+    [
+        AWSS3Reader("s3://mybucket/csv/city.csv", streaming=True),
+        AWSS3Reader("s3://mybucket/csv/city.csv", max_workers=4, part_size=1024),
+    ],
+    ids=["streaming", "ranged"],
+)
+def test_s3_ストリーミング読み込み(s3_objects, reader):
+    with open("tests/data/mysql/csv/city.csv", "rb") as f:
+        expected = f.read()
+
+    with reader.read() as stream:
+        assert stream.read() == expected
+
+    # ヘッダ有無の推定を含めて、seekできないストリームをそのままパースできる
+    with reader.read() as stream:
+        res = CSVFormatter().parse(stream)
+    assert res[0] == {"ID": "1", "Name": "Kabul", "CountryCode": "AFG", "District": "Kabol", "Population": "1780000"}
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_s3_並列読み込み_parquet(s3_objects):
+    expected = ParquetFormatter().parse(AWSS3Reader("s3://mybucket/country.parquet").read())
+
+    reader = AWSS3Reader("s3://mybucket/country.parquet", max_workers=4, part_size=512)
+    with reader.read() as stream:
+        res = ParquetFormatter().parse(stream)
+
+    assert res == expected
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_local_メモリマップ読み込み():
+    with LocalReader("tests/data/mysql/csv/city.csv").read() as stream:
+        expected_csv = CSVFormatter().parse(stream)
+    with LocalReader("tests/data/mysql/parquet/country.parquet").read() as stream:
+        expected_parquet = ParquetFormatter().parse(stream)
+
+    with LocalReader("tests/data/mysql/csv/city.csv", use_mmap=True).read() as stream:
+        assert CSVFormatter().parse(stream) == expected_csv
+    assert stream.closed
+
+    with LocalReader("tests/data/mysql/parquet/country.parquet", use_mmap=True).read() as stream:
+        assert ParquetFormatter().parse(stream) == expected_parquet
+
+
+@pytest.fixture
+def s3_parts():
+    """city.csvをヘッダ付きの3つのオブジェクトに分割して配置する"""
+    with open("tests/data/mysql/csv/city.csv", "rb") as f:
+        header, *lines = f.read().splitlines(keepends=True)
+    with mock_s3():
+        s3 = boto3.resource("s3")
+        s3.create_bucket(Bucket="mybucket")  # type: ignore
+        for i in range(3):
+            body = header + b"".join(lines[i::3])
+            s3.Object("mybucket", f"exports/part-{i:04d}.csv").put(Body=body)  # type: ignore
+        s3.Object("mybucket", "exports/_SUCCESS").put(Body=b"")  # type: ignore
+        s3.Object("mybucket", "exports/old/part-0000.txt").put(Body=b"")  # type: ignore
+        yield s3
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+@pytest.mark.parametrize("ordered", [True, False], ids=["ordered", "unordered"])
+def test_s3_プレフィクス読み込み(s3_parts, ordered):
+    with LocalReader("tests/data/mysql/csv/city.csv").read() as stream:
+        expected = CSVFormatter().parse(stream)
+
+    reader = AWSS3PrefixReader("s3://mybucket/exports/part-*.csv", max_workers=2, ordered=ordered)
+    with reader.read() as source:
+        assert source.keys == [f"exports/part-{i:04d}.csv" for i in range(3)]
+        res = [row for df in CSVFormatter().parse_parts(source) for row in df.to_dict("records")]
+
+    assert len(res) == len(expected)
+    assert sorted(res, key=lambda r: int(r["ID"])) == expected
+    if ordered:
+        assert [r["ID"] for r in res[:3]] == ["1", "4", "7"]
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_s3_プレフィクス読み込み_一致なし(s3_parts):
+    with pytest.raises(FileNotFoundError):
+        AWSS3PrefixReader("s3://mybucket/exports/*.parquet").read()
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_s3_プレフィクスからのタスク実行(s3_parts, recording_engine):
+    calls = recording_engine
+    task = DMLTask(
+        target=OperationTarget("mysql", "dev", "city"),
+        operaton=OperationType.RELOAD,
+        source=DataSrc(AWSS3PrefixReader("s3://mybucket/exports/part-", max_workers=2), CSVFormatter(chunk_size=4)),
+    )
+    report = task.run()
+    assert sum(c[2] for c in calls if c[0] == "insert") == 20
+    assert report.rows_parsed == 20
+
+    calls.clear()
+    asyncio.run(task.run_async())
+    assert sum(c[2] for c in calls if c[0] == "insert") == 20
+
+
+def _compress(compression, data):
+    if compression == "gzip":
+        import gzip
+
+        return gzip.compress(data)
+    if compression == "bz2":
+        import bz2
+
+        return bz2.compress(data)
+    import zstandard
+
+    return zstandard.ZstdCompressor().compress(data)
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+@pytest.mark.parametrize("compression, extension", [("gzip", ".gz"), ("bz2", ".bz2"), ("zstd", ".zst"), ("gzip", "")])
+@pytest.mark.parametrize("use_mmap", [False, True], ids=["copy", "mmap"])
+def test_local_圧縮ファイルの展開(tmp_path, compression, extension, use_mmap):
+    with open("tests/data/mysql/csv/city.csv", "rb") as f:
+        expected = f.read()
+    # 拡張子がない場合は、sniffを指定するとマジックバイトから判定する
+    option = "infer" if extension else "sniff"
+    path = tmp_path / f"city.csv{extension}"
+    path.write_bytes(_compress(compression, expected))
+
+    with LocalReader(str(path), use_mmap=use_mmap, compression=option).read() as stream:
+        assert stream.read() == expected
+    with LocalReader(str(path), use_mmap=use_mmap, compression=option).read() as stream:
+        assert len(CSVFormatter().parse(stream)) == 20
+    assert stream.closed
+
+    with LocalReader(str(path), compression=None).read() as stream:
+        assert stream.read() != expected
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_local_マジックバイトで始まる非圧縮ファイル(tmp_path):
+    data = b"BZh,name\n1,a\n"
+    path = tmp_path / "bzh.csv"
+    path.write_bytes(data)
+
+    # 既定では拡張子のみで判定し、先頭のバイト列によらずそのまま読み込む
+    with LocalReader(str(path)).read() as stream:
+        assert stream.read() == data
+    with LocalReader(str(path), use_mmap=True).read() as stream:
+        assert stream.read() == data
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+@pytest.mark.parametrize("options", [{"streaming": True}, {"max_workers": 4, "part_size": 256}], ids=["streaming", "ranged"])
+def test_s3_圧縮オブジェクトの展開(s3_objects, options):
+    with open("tests/data/mysql/csv/city.csv", "rb") as f:
+        expected = f.read()
+    s3_objects.Object("mybucket", "csv/city.csv.gz").put(Body=_compress("gzip", expected * 2))
+
+    with AWSS3Reader("s3://mybucket/csv/city.csv.gz", **options).read() as stream:
+        assert stream.read() == expected * 2
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_未対応の圧縮形式():
+    with pytest.raises(ValueError):
+        LocalReader("tests/data/mysql/csv/city.csv", compression="lzma")
@@ -5,7 +5,8 @@ import boto3
 
 from tasks.etl_task import DMLTask, DDLTask
 from tasks.data_formatter import CSVFormatter, ParquetFormatter
-from tasks.models.operation import DataSrc, OperationTarget, OperationType
+from tasks.models.model import ColumnSchema, TableSchema
+from tasks.models.operation import DataSrc, InsertMethod, OperationTarget, OperationType, ReloadStrategy
 from tasks.data_reader import LocalReader, AWSS3Reader
 
 from tasks.engines.factory import DBFactory
@@ -209,6 +210,40 @@ class TestTask:
         ).purge_binlog()
 
 
+    @pytest.mark.integration
+    @pytest.mark.normal
+    def test_LOAD_DATAによる一括投入(self, mock_config):
+        # 準備: サーバ側でLOCAL INFILEを許可
+        DDLTask(
+            target=OperationTarget("mysql", None, None),
+        ).run(self.ddl_queries + ["SET GLOBAL local_infile = 1"])
+
+        # 実行
+        DMLTask(
+            target=OperationTarget("mysql", "dev", "country"),
+            operaton=OperationType.INSERT,
+            source=DataSrc(LocalReader("tests/data/mysql/parquet/country.parquet"), ParquetFormatter()),
+            insert_method=InsertMethod.LOAD_DATA,
+        ).run()
+
+        DMLTask(
+            target=OperationTarget("mysql", "dev", "city"),
+            operaton=OperationType.RELOAD,
+            source=DataSrc(LocalReader("tests/data/mysql/csv/city.csv"), CSVFormatter(chunk_size=1000)),
+            insert_method=InsertMethod.LOAD_DATA,
+        ).run()
+
+        # 検証: executemanyで投入した場合と同じ内容になる
+        with DBFactory.get_engine(OperationTarget("mysql", "dev", None)) as db:
+            cnt, res = db.execute("SELECT * FROM city WHERE ID <= 3;")
+            assert cnt == 3
+            assert res == [
+                {"ID": 1, "Name": "Kabul", "CountryCode": "AFG", "District": "Kabol", "Population": 1780000},
+                {"ID": 2, "Name": "Qandahar", "CountryCode": "AFG", "District": "Qandahar", "Population": 237500},
+                {"ID": 3, "Name": "Herat", "CountryCode": "AFG", "District": "Herat", "Population": 186800},
+            ]
+
+
     @pytest.mark.integration
     @pytest.mark.abnormal
     def test_ヘッダなしのCSVをカラム名情報無しで扱う場合(self, mock_config):
@@ -289,4 +324,121 @@ class TestTask:
                     AWSS3Reader("invalid://dummy-bucket/invalid-key.csv"),
                     CSVFormatter(encoding="utf-8", has_header=True),
                 ),
-            ).run()
\ No newline at end of file
+            ).run()
+
+    @pytest.mark.integration
+    @pytest.mark.abnormal
+    def test_外部キーのあるテーブルを入れ替えで再投入する場合(self, mock_config):
+        # DDL実行
+        DDLTask(
+            target=OperationTarget("mysql", None, None),
+        ).run(self.ddl_queries)
+
+        with pytest.raises(ValueError):
+            DMLTask(
+                target=OperationTarget("mysql", "dev", "city"),
+                operaton=OperationType.RELOAD,
+                source=DataSrc(LocalReader("tests/data/mysql/csv/city.csv"), CSVFormatter()),
+                reload_strategy=ReloadStrategy.SHADOW,
+            ).run()
+
+
+    @pytest.mark.integration
+    @pytest.mark.normal
+    def test_差分のみの再投入(self, mock_config):
+        DDLTask(
+            target=OperationTarget("mysql", None, None),
+        ).run(self.ddl_queries)
+        DMLTask(
+            target=OperationTarget("mysql", "dev", "country"),
+            operaton=OperationType.INSERT,
+            source=DataSrc(LocalReader("tests/data/mysql/parquet/country.parquet"), ParquetFormatter()),
+        ).run()
+        DMLTask(
+            target=OperationTarget("mysql", "dev", "city"),
+            operaton=OperationType.RELOAD,
+            source=DataSrc(LocalReader("tests/data/mysql/csv/city.csv"), CSVFormatter()),
+        ).run()
+
+        # 実行: ID 1-3を変更したデータで差分のみ再投入
+        DMLTask(
+            target=OperationTarget("mysql", "dev", "city"),
+            operaton=OperationType.UPSERT,
+            source=DataSrc(LocalReader("tests/data/mysql/csv/normal/01_city_upsert.csv"), CSVFormatter()),
+        ).run()
+        DMLTask(
+            target=OperationTarget("mysql", "dev", "city"),
+            operaton=OperationType.RELOAD,
+            source=DataSrc(LocalReader("tests/data/mysql/csv/city.csv"), CSVFormatter()),
+            reload_strategy=ReloadStrategy.INCREMENTAL,
+        ).run()
+
+        # 検証: 全件を再投入した場合と同じ内容に戻る
+        with DBFactory.get_engine(OperationTarget("mysql", "dev", None)) as db:
+            cnt, res = db.execute("SELECT * FROM city WHERE ID <= 3;")
+            assert cnt == 3
+            assert res == [
+                {"ID": 1, "Name": "Kabul", "CountryCode": "AFG", "District": "Kabol", "Population": 1780000},
+                {"ID": 2, "Name": "Qandahar", "CountryCode": "AFG", "District": "Qandahar", "Population": 237500},
+                {"ID": 3, "Name": "Herat", "CountryCode": "AFG", "District": "Herat", "Population": 186800},
+            ]
+
+
+class ShadowRecordingEngine:
+    """RELOADで呼び出されたテーブル操作を記録するエンジン"""
+
+    def __init__(self, calls, foreign_keys):
+        self.calls = calls
+        self.foreign_keys = foreign_keys
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def get_table_schema(self, table_name):
+        return TableSchema(table_name, [ColumnSchema(c, 253, False, c == "ID") for c in ("ID", "Name")])
+
+    def get_foreign_keys(self):
+        return self.foreign_keys
+
+    def create_staging_table(self, table_name):
+        self.calls.append(("create", table_name))
+        return "shadow"
+
+    def insert(self, table_name, data, method=None):
+        self.calls.append(("insert", table_name, len(data)))
+
+    def commit(self):
+        self.calls.append(("commit",))
+
+    def swap_table(self, table_name, shadow_table_name):
+        self.calls.append(("swap", table_name, shadow_table_name))
+
+    def drop_table(self, table_name):
+        self.calls.append(("drop", table_name))
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_別テーブルに投入してから入れ替える(tmp_path):
+    path = tmp_path / "t.csv"
+    path.write_text("ID,Name\n1,a\n2,b\n")
+    calls = []
+
+    with patch.object(DBFactory, "get_engine", return_value=ShadowRecordingEngine(calls, [("city", "country")])):
+        DMLTask(
+            target=OperationTarget("mysql", "dev", "t"),
+            operaton=OperationType.RELOAD,
+            source=DataSrc(LocalReader(str(path)), CSVFormatter()),
+            reload_strategy=ReloadStrategy.SHADOW,
+        ).run()
+
+    assert calls == [
+        ("create", "t"),
+        ("insert", "shadow", 2),
+        ("commit",),
+        ("swap", "t", "shadow"),
+        ("drop", "shadow"),
+    ]
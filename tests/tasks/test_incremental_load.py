@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from tasks.incremental_load import IncrementalLoader
+from tasks.models.operation import OperationTarget
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_差分の行のみを書き込む(diffing_engine):
+    db = diffing_engine(
+        [
+            ("1", "Kabul", "AFG", "Kabol", "1780000"),
+            ("2", "Qandahar", "AFG", "Qandahar", "237500"),
+            ("3", "Herat", "AFG", None, "186800"),
+            ("4", "Mazar-e-Sharif", "AFG", "Balkh", "127800"),
+        ]
+    )
+    source = [
+        pd.DataFrame(
+            {"ID": ["1", "2"], "Name": ["Kabul", "Qandahar"], "CountryCode": ["AFG", "AFG"],
+             "District": ["Kabol", "Qandahar"], "Population": ["1780000", "0"]}
+        ),
+        pd.DataFrame(
+            {"ID": ["3", "5"], "Name": ["Herat", "Amsterdam"], "CountryCode": ["AFG", "NLD"],
+             "District": ["", "Noord-Holland"], "Population": ["186800", "731200"]}
+        ),
+    ]
+
+    result = IncrementalLoader(OperationTarget("mysql", "dev", "city")).load(db, source)
+
+    # 空文字は投入時と同じくNULLとして比較される
+    assert result == (2, 1)
+    assert db.calls == [
+        ("delete", "city", ["4"]),
+        ("upsert", "city", ["2", "5"]),
+        ("commit",),
+        ("drop", "city__stg", True),
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_失敗しても作業用テーブルを削除する(diffing_engine):
+    db = diffing_engine([])
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("failed")
+
+    db.upsert = fail
+    source = [pd.DataFrame({"ID": ["1"], "Name": ["a"], "CountryCode": ["b"], "District": ["c"], "Population": ["0"]})]
+
+    with pytest.raises(RuntimeError):
+        IncrementalLoader(OperationTarget("mysql", "dev", "city")).load(db, source)
+
+    # 一時テーブルとして削除し、未コミットの変更を暗黙的にコミットしない
+    assert db.calls == [("drop", "city__stg", True)]
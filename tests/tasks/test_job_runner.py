@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from tasks.etl_task import DMLTask
+from tasks.job_runner import DMLJobRunner
+from tasks.data_formatter import CSVFormatter
+from tasks.data_reader import LocalReader
+from tasks.models.operation import DataSrc, OperationTarget, OperationType
+
+# city.CountryCode -> country.Code, countrylanguage.CountryCode -> country.Code
+FOREIGN_KEYS = {
+    ("mysql://dev", "city"): {("mysql://dev", "country")},
+    ("mysql://dev", "countrylanguage"): {("mysql://dev", "country")},
+}
+
+
+def make_task(table_name, operation):
+    source = None
+    if operation != OperationType.TRUNCATE:
+        source = DataSrc(LocalReader(f"tests/data/mysql/csv/{table_name}.csv"), CSVFormatter())
+    return DMLTask(
+        target=OperationTarget("mysql", "dev", table_name),
+        operaton=operation,
+        source=source,
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_外部キーに基づく依存関係():
+    tasks = [
+        make_task("city", OperationType.INSERT),
+        make_task("countrylanguage", OperationType.INSERT),
+        make_task("country", OperationType.INSERT),
+        make_task("city", OperationType.TRUNCATE),
+        make_task("country", OperationType.TRUNCATE),
+    ]
+
+    dependencies = DMLJobRunner.build_dependencies(tasks, FOREIGN_KEYS)
+
+    assert dependencies == {
+        0: {2},  # cityの投入はcountryの投入後
+        1: {2},  # countrylanguageの投入はcountryの投入後
+        2: set(),
+        3: {0, 2},  # 同じテーブルへの操作は渡された順、書き込みと削除の混在も渡された順
+        4: {0, 1, 2, 3},  # countryの削除はcityの削除後
+    }
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_循環する依存関係():
+    # 相互に参照するテーブルでは、同じテーブルへの操作の順序と参照先を先に書き込む順序が矛盾する
+    tasks = [
+        make_task("city", OperationType.INSERT),
+        make_task("country", OperationType.INSERT),
+        make_task("city", OperationType.UPSERT),
+    ]
+    foreign_keys = {
+        ("mysql://dev", "city"): {("mysql://dev", "country")},
+        ("mysql://dev", "country"): {("mysql://dev", "city")},
+    }
+
+    with pytest.raises(ValueError):
+        DMLJobRunner.build_dependencies(tasks, foreign_keys)
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_依存関係に従った並列実行(monkeypatch):
+    tasks = [
+        make_task("city", OperationType.INSERT),
+        make_task("countrylanguage", OperationType.INSERT),
+        make_task("country", OperationType.INSERT),
+    ]
+    events = []
+    lock = threading.Lock()
+    both_children_started = threading.Barrier(2, timeout=5)
+
+    def fake_run(task):
+        def run():
+            with lock:
+                events.append(task.target.table_name)
+            if task.target.table_name != "country":
+                # 依存関係のないcityとcountrylanguageは同時に実行される
+                both_children_started.wait()
+        return run
+
+    for task in tasks:
+        monkeypatch.setattr(task, "run", fake_run(task))
+    monkeypatch.setattr(DMLJobRunner, "_get_foreign_keys", lambda self: FOREIGN_KEYS)
+
+    DMLJobRunner(tasks, max_workers=2).run()
+
+    assert events[0] == "country"
+    assert sorted(events[1:]) == ["city", "countrylanguage"]
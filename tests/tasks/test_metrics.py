@@ -0,0 +1,83 @@
+import json
+import os
+import resource
+
+import pytest
+
+from tasks.etl_task import DMLTask
+from tasks.data_formatter import CSVFormatter
+from tasks.data_reader import LocalReader
+from tasks.metrics import MetricsSinkInterface, RunReport, add_metrics_sink, remove_metrics_sink, reporting
+from tasks.models.operation import DataSrc, OperationTarget, OperationType
+
+
+class ListSink(MetricsSinkInterface):
+    def __init__(self):
+        self.reports = []
+
+    def emit(self, report):
+        self.reports.append(report)
+
+
+@pytest.fixture
+def sink():
+    sink = ListSink()
+    add_metrics_sink(sink)
+    yield sink
+    remove_metrics_sink(sink)
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_実行結果の計測(sink, recording_engine):
+    path = "tests/data/mysql/csv/city.csv"
+    task = DMLTask(
+        target=OperationTarget("mysql", "dev", "city"),
+        operaton=OperationType.RELOAD,
+        source=DataSrc(LocalReader(path), CSVFormatter(chunk_size=15)),
+    )
+
+    report = task.run()
+
+    assert sink.reports == [report]
+    result = json.loads(report.to_json())
+    assert result["status"] == "succeeded"
+    assert result["bytes_read"] >= os.path.getsize(path)
+    assert result["rows_parsed"] == 20
+    assert result["rows_written"] == 20
+    assert result["write_count"] == 3  # truncate + 2バッチ
+    assert result["commit_seconds"] > 0
+    assert result["peak_memory_bytes"] > 0
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_失敗した実行の計測(sink, recording_engine):
+    task = DMLTask(
+        target=OperationTarget("mysql", "dev", "city"),
+        operaton=OperationType.RELOAD,
+        source=DataSrc(
+            LocalReader("tests/data/mysql/csv/normal/03_city_no_header.csv"),
+            CSVFormatter(has_header=False, column_names=None),
+        ),
+    )
+
+    with pytest.raises(ValueError):
+        task.run()
+
+    assert [r.status for r in sink.reports] == ["failed"]
+    assert sink.reports[0].rows_written == 0
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="RSS is not available")
+def test_最大メモリは実行中のみ計測する():
+    # 実行前に一時的に大きなメモリを使用し、プロセス開始からの最大RSSを押し上げる
+    garbage = b"x" * (256 * 1024 * 1024)
+    del garbage
+
+    with reporting(RunReport("DMLTask", "INSERT", "mysql://dev.city")) as report:
+        pass
+
+    assert 0 < report.peak_memory_bytes < resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
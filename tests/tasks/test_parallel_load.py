@@ -0,0 +1,140 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from tasks.engines.factory import DBFactory
+from tasks.engines.pool import ConnectionPool
+from tasks.metrics import MeteredDBEngine, RunReport
+from tasks.models.model import ColumnSchema, TableSchema
+from tasks.models.operation import OperationTarget
+from tasks.parallel_load import PartitionedLoader
+
+
+class RecordingEngine:
+    """作業用テーブルへの書き込みと反映を記録するエンジン"""
+
+    def __init__(self, tables, fail_on=None):
+        self.tables = tables
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+        self.committed = False
+        self.rolled_back = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def get_table_schema(self, table_name):
+        return TableSchema(
+            table_name,
+            [ColumnSchema("ID", "int", False, True), ColumnSchema("Name", "varchar", False, False)],
+        )
+
+    def create_staging_table(self, table_name):
+        self.tables["stg"] = []
+        return "stg"
+
+    def drop_table(self, table_name):
+        self.tables.pop(table_name)
+
+    def insert(self, table_name, data, method=None):
+        if self.fail_on is not None and self.fail_on in set(data["ID"]):
+            raise RuntimeError("insert failed")
+        with self.lock:
+            self.tables[table_name].extend(data.to_dict("records"))
+
+    def copy_rows(self, src_table_name, table_name, replace=False):
+        self.tables[table_name] = (
+            [] if replace else self.tables[table_name]
+        ) + self.tables[src_table_name]
+        return len(self.tables[src_table_name])
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def frames():
+    yield pd.DataFrame({"ID": [1, 2, 3, 4], "Name": ["a", "b", "c", "d"]})
+    yield pd.DataFrame({"ID": [5, 6], "Name": ["e", "f"]})
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_プライマリーキーのハッシュで分割():
+    df = pd.DataFrame({"ID": [1, 2, 3, 4, 5, 6, 1], "Name": list("abcdefg")})
+
+    partitions = PartitionedLoader.partition(df, ["ID"], 3)
+
+    assert sum(len(p) for p in partitions) == len(df)
+    # 同じキーの行は同じ分割に入る
+    assert [i for i, p in enumerate(partitions) if 1 in set(p["ID"])] == [
+        i for i, p in enumerate(partitions) if {"a", "g"} <= set(p["Name"])
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_並列に投入して既存の行を置き換える(monkeypatch):
+    tables = {"city": [{"ID": 0, "Name": "old"}]}
+    monkeypatch.setattr(DBFactory, "get_engine", lambda *args, **kwargs: RecordingEngine(tables))
+    db = RecordingEngine(tables)
+
+    affected = PartitionedLoader(OperationTarget("mysql", "dev", "city"), 3).load(db, frames(), replace=True)
+
+    assert affected == 6
+    assert sorted(row["ID"] for row in tables["city"]) == [1, 2, 3, 4, 5, 6]
+    assert db.committed
+    assert "stg" not in tables
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_一部の書き込みに失敗した場合は反映しない(monkeypatch):
+    tables = {"city": [{"ID": 0, "Name": "old"}]}
+    monkeypatch.setattr(DBFactory, "get_engine", lambda *args, **kwargs: RecordingEngine(tables, fail_on=5))
+    db = RecordingEngine(tables)
+
+    with pytest.raises(RuntimeError):
+        PartitionedLoader(OperationTarget("mysql", "dev", "city"), 3).load(db, frames(), replace=True)
+
+    assert tables["city"] == [{"ID": 0, "Name": "old"}]
+    assert not db.committed
+    assert "stg" not in tables
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_接続プールに収まらない並列数(monkeypatch):
+    tables = {"city": []}
+    engine = RecordingEngine(tables)
+    engine.pool = ConnectionPool(lambda: None, max_size=3)
+    monkeypatch.setattr(DBFactory, "get_engine", lambda *args, **kwargs: engine)
+
+    # 反映用の1本と書き込み用の3本はmax_sizeを超えるため、書き込み前に失敗する
+    with pytest.raises(ValueError):
+        PartitionedLoader(OperationTarget("mysql", "dev", "city"), 3).load(engine, frames())
+    assert tables == {"city": []}
+
+    assert PartitionedLoader(OperationTarget("mysql", "dev", "city"), 2).load(engine, frames()) == 6
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_並列の書き込みを計測する(monkeypatch):
+    tables = {"city": []}
+    monkeypatch.setattr(DBFactory, "get_engine", lambda *args, **kwargs: RecordingEngine(tables))
+    report = RunReport("DMLTask", "INSERT", "mysql://dev.city")
+    db = MeteredDBEngine(RecordingEngine(tables), report)
+
+    PartitionedLoader(OperationTarget("mysql", "dev", "city"), 3, report=report).load(db, frames())
+
+    # 分割した書き込みごとの所要時間と、反映1回分を記録する。反映した行は二重に数えない
+    partition_writes = sum(len(p) > 0 for df in frames() for p in PartitionedLoader.partition(df, ["ID"], 3))
+    assert len(report.write_latencies) == partition_writes + 1
+    assert report.rows_written == 6
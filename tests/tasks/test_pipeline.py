@@ -0,0 +1,49 @@
+import time
+from io import BytesIO
+
+import pytest
+
+from tasks.data_formatter import CSVFormatter
+from tasks.pipeline import PipelinedSource
+
+
+def make_csv(rows):
+    lines = ['"ID","Name"'] + [f'"{i}","name_{i}"' for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_パイプライン実行():
+    data = make_csv(1000)
+    expected = list(CSVFormatter(chunk_size=100).parse_frames(BytesIO(data)))
+
+    # ブロックサイズを小さくし、読み込み段からパース段へ複数回に分けて渡す
+    with PipelinedSource(BytesIO(data), CSVFormatter(chunk_size=100), queue_size=2, block_size=1024) as pipeline:
+        res = list(pipeline)
+
+    assert len(res) == 10
+    assert all(a.equals(b) for a, b in zip(res, expected))
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_パイプライン実行_パース段の失敗():
+    with PipelinedSource(BytesIO(make_csv(10)), CSVFormatter(has_header=False, column_names=None)) as pipeline:
+        with pytest.raises(ValueError):
+            list(pipeline)
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_パイプライン実行_書き込み段の失敗():
+    pipeline = PipelinedSource(BytesIO(make_csv(10_000)), CSVFormatter(chunk_size=10), queue_size=1)
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        with pipeline:
+            for _ in pipeline:
+                raise RuntimeError("write failed")
+
+    # 上流の段はバックプレッシャーで待機していても停止される
+    assert all(not t.is_alive() for t in pipeline._threads)
+    assert time.monotonic() - start < 5
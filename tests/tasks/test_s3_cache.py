@@ -0,0 +1,86 @@
+import os
+from unittest.mock import patch
+
+import boto3
+import pytest
+from moto import mock_s3
+
+from tasks.data_formatter import CSVFormatter
+from tasks.data_reader import AWSS3Reader
+from tasks.s3_cache import S3ObjectCache
+
+
+@pytest.fixture
+def s3_client():
+    with mock_s3():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket="mybucket")
+        with open("tests/data/mysql/csv/city.csv", "rb") as f:
+            client.put_object(Bucket="mybucket", Key="csv/city.csv", Body=f.read())
+        yield client
+
+
+def _entries(cache: S3ObjectCache):
+    return sorted(p.name for p in cache.directory.glob(f"*{S3ObjectCache.SUFFIX}"))
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_キャッシュからの読み込み(s3_client, tmp_path):
+    cache = S3ObjectCache(str(tmp_path))
+    reader = AWSS3Reader("s3://mybucket/csv/city.csv", cache=cache)
+    with open("tests/data/mysql/csv/city.csv", "rb") as f:
+        expected = f.read()
+
+    with reader.read() as stream:
+        assert stream.read() == expected
+    assert len(_entries(cache)) == 1
+
+    # 2回目はダウンロードせずにキャッシュを読む
+    with patch.object(s3_client, "get_object", side_effect=AssertionError("downloaded")):
+        path = cache.fetch(s3_client, "mybucket", "csv/city.csv")
+    assert path.read_bytes() == expected
+
+    # オブジェクトが更新されるとETagが変わり、新しい内容を取得する
+    s3_client.put_object(Bucket="mybucket", Key="csv/city.csv", Body=expected.replace(b"Kabul", b"Kaboul"))
+    with AWSS3Reader("s3://mybucket/csv/city.csv", cache=cache).read() as stream:
+        res = CSVFormatter().parse(stream)
+    assert res[0]["Name"] == "Kaboul"
+    assert len(_entries(cache)) == 2
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_キャッシュのLRU削除(s3_client, tmp_path):
+    for i in range(3):
+        s3_client.put_object(Bucket="mybucket", Key=f"part-{i}", Body=bytes([i]) * 100)
+    cache = S3ObjectCache(str(tmp_path), max_bytes=250)
+
+    first = cache.fetch(s3_client, "mybucket", "part-0")
+    second = cache.fetch(s3_client, "mybucket", "part-1")
+    os.utime(first, (1, 1))
+    os.utime(second, (2, 2))
+    # part-0を参照し直すと、part-1が最も古くなる
+    cache.fetch(s3_client, "mybucket", "part-0")
+    third = cache.fetch(s3_client, "mybucket", "part-2")
+
+    assert first.exists() and third.exists()
+    assert not second.exists()
+    assert len(_entries(cache)) == 2
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_ロックファイルが増え続けない(s3_client, tmp_path):
+    cache = S3ObjectCache(str(tmp_path), max_bytes=100)
+    for i in range(50):
+        s3_client.put_object(Bucket="mybucket", Key="part", Body=bytes([i]) * 10)
+        cache.fetch(s3_client, "mybucket", "part")
+
+    # 更新のたびにETagが変わっても、エントリ以外は固定の名前(高々257個)のロックファイルのみとなる
+    lock_names = {f".fill-{i:02x}.lock" for i in range(256)} | {".evict.lock"}
+    others = {p.name for p in tmp_path.iterdir() if p.suffix != S3ObjectCache.SUFFIX}
+    assert others <= lock_names
+    assert sum(p.stat().st_size for p in tmp_path.glob(f"*{S3ObjectCache.SUFFIX}")) <= 100
@@ -0,0 +1,132 @@
+import os
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from tasks.data_formatter import CSVFormatter, ParquetFormatter
+from tasks.data_reader import LocalReader
+from tasks.etl_task import DMLTask
+from tasks.models.operation import DataSrc, OperationTarget, OperationType
+from tasks.source_cache import ParsedSourceCache
+
+
+@pytest.fixture
+def run_reload(recording_engine):
+    """sourceからRELOADを実行し、投入した行数を返す関数"""
+
+    def run(source: DataSrc) -> int:
+        recording_engine.clear()
+        DMLTask(target=OperationTarget("mysql", "dev", "city"), operaton=OperationType.RELOAD, source=source).run()
+        return sum(c[2] for c in recording_engine if c[0] == "insert")
+
+    return run
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_パース結果のキャッシュ(tmp_path, run_reload):
+    path = tmp_path / "city.csv"
+    shutil.copy("tests/data/mysql/csv/city.csv", path)
+    cache = ParsedSourceCache(str(tmp_path / "cache"))
+    with LocalReader(str(path)).read() as stream:
+        expected = CSVFormatter().parse(stream)
+
+    assert run_reload(DataSrc(LocalReader(str(path)), CSVFormatter(chunk_size=7), cache=cache)) == 20
+    assert len(list(cache.directory.glob("*.parquet"))) == 1
+
+    # 2回目はCSVをパースせずにキャッシュを読み込む
+    with patch.object(CSVFormatter, "parse_frames", side_effect=AssertionError("parsed")):
+        assert run_reload(DataSrc(LocalReader(str(path)), CSVFormatter(chunk_size=7), cache=cache)) == 20
+        stream, formatter = cache.open(LocalReader(str(path)), CSVFormatter())
+        with stream:
+            assert formatter.parse(stream) == expected
+        # バッチはキャッシュ作成時ではなく、読み込み時のフォーマッタのchunk_sizeで区切る
+        stream, formatter = cache.open(LocalReader(str(path)), CSVFormatter(chunk_size=8))
+        with stream:
+            frames = list(formatter.parse_frames(stream, columns=["ID"]))
+        assert [len(df) for df in frames] == [8, 8, 4]
+        assert list(frames[0].columns) == ["ID"]
+        assert [v for df in frames for v in df["ID"]] == [row["ID"] for row in expected]
+
+    # ソースの更新・フォーマッタ設定の違いは別のキャッシュとなる
+    os.utime(path, ns=(0, 0))
+    assert run_reload(DataSrc(LocalReader(str(path)), CSVFormatter(), cache=cache)) == 20
+    assert run_reload(DataSrc(LocalReader(str(path)), CSVFormatter(encoding="utf-8-sig"), cache=cache)) == 20
+    assert len(list(cache.directory.glob("*.parquet"))) == 3
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_パースに失敗した場合はキャッシュしない(tmp_path, run_reload):
+    cache = ParsedSourceCache(str(tmp_path))
+    source = DataSrc(
+        LocalReader("tests/data/mysql/csv/normal/03_city_no_header.csv"),
+        CSVFormatter(has_header=False),
+        cache=cache,
+    )
+    with pytest.raises(ValueError):
+        run_reload(source)
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_キャッシュの行グループの大きさ(tmp_path, monkeypatch):
+    monkeypatch.setattr(ParsedSourceCache, "ROW_GROUP_SIZE", 6)
+    cache = ParsedSourceCache(str(tmp_path))
+    location = LocalReader("tests/data/mysql/csv/city.csv")
+
+    # 作成時のバッチの区切りによらず、ROW_GROUP_SIZE行ずつ保持する
+    stream, formatter = cache.open(location, CSVFormatter(chunk_size=4))
+    with stream:
+        assert [len(df) for df in formatter.parse_frames(stream)] == [4] * 5
+
+    stream, formatter = cache.open(location, CSVFormatter())
+    with stream:
+        assert [len(df) for df in formatter.parse_frames(stream)] == [6, 6, 6, 2]
+    stream, formatter = cache.open(location, CSVFormatter(chunk_size=4))
+    with stream:
+        assert [len(df) for df in formatter.parse_frames(stream)] == [4] * 5
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_同じフォーマッタを再利用してもキャッシュを使う(tmp_path):
+    cache = ParsedSourceCache(str(tmp_path))
+    location = LocalReader("tests/data/mysql/csv/city.csv")
+    formatter = CSVFormatter(chunk_size=10)
+
+    for _ in range(3):
+        stream, parsing_formatter = cache.open(location, formatter)
+        with stream:
+            assert sum(len(df) for df in parsing_formatter.parse_frames(stream)) == 20
+
+    # has_headerの推定結果でキャッシュのキーが変わらない
+    assert formatter.has_header is None
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_読み込むカラムのみをキャッシュする(tmp_path):
+    cache = ParsedSourceCache(str(tmp_path))
+    location = LocalReader("tests/data/mysql/parquet/country.parquet")
+
+    # キャッシュがない場合も、ソースから読み込むのは指定したカラムのみ
+    stream, formatter = cache.open(location, ParquetFormatter(), columns=["Code", "Name"])
+    with stream:
+        frames = list(formatter.parse_frames(stream, columns=["Code", "Name"]))
+    assert [list(df.columns) for df in frames] == [["Code", "Name"]]
+
+    stream, formatter = cache.open(location, ParquetFormatter(), columns=["Code", "Name"])
+    with stream:
+        frames = list(formatter.parse_frames(stream, columns=["Code", "Name"]))
+    assert [list(df.columns) for df in frames] == [["Code", "Name"]]
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+
+    # 読み込むカラムが異なる場合は別のキャッシュとなる
+    stream, formatter = cache.open(location, ParquetFormatter(), columns=["Code"])
+    with stream:
+        assert [list(df.columns) for df in formatter.parse_frames(stream, columns=["Code"])] == [["Code"]]
+    assert len(list(tmp_path.glob("*.parquet"))) == 2
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# tasksのimportにかける時間の上限(秒)。pandas・boto3等をimport時に読み込むと超える
+IMPORT_TIME_BUDGET = 0.5
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_import時に重い依存と設定ファイルを読み込まない(tmp_path):
+    code = """
+import json, sys, time
+start = time.perf_counter()
+import tasks.etl_task, tasks.job_runner, utils.config
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("pandas", "numpy", "boto3", "fastparquet") if m in sys.modules]
+print(json.dumps({"elapsed": elapsed, "heavy": heavy, "config_loaded": utils.config._config is not None}))
+"""
+    # 設定ファイルのないディレクトリから実行する
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": ROOT_DIR},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    startup = json.loads(result.stdout)
+    assert startup["heavy"] == []
+    assert startup["config_loaded"] is False
+    assert startup["elapsed"] < IMPORT_TIME_BUDGET
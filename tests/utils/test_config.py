@@ -0,0 +1,48 @@
+import pytest
+
+from utils import config as config_module
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "other.toml"
+    path.write_text('[mysql]\nhost = "db"\nport = 3307\nuser = "etl"\npassword = ""\n\n[logging]\nlevel = "DEBUG"\n')
+    yield str(path)
+    config_module.set_config_path(None)
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_指定したパスの設定を初回の利用時に読み込む(config_file):
+    config_module.set_config_path(config_file)
+
+    assert config_module._config is None
+    assert config_module.load_config()["mysql"]["port"] == 3307
+    assert config_module.config["logging"]["level"] == "DEBUG"
+
+
+@pytest.mark.unit
+@pytest.mark.abnormal
+def test_設定ファイルが存在しない場合(tmp_path):
+    config_module.set_config_path(str(tmp_path / "missing.toml"))
+    try:
+        with pytest.raises(FileNotFoundError):
+            config_module.load_config()
+    finally:
+        config_module.set_config_path(None)
+
+
+@pytest.mark.unit
+@pytest.mark.normal
+def test_省略可能な設定(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(config_module.CONFIG_PATH_ENV, raising=False)
+    monkeypatch.setattr(config_module, "_DEFAULT_CONFIG_PATH", tmp_path / "config.toml")
+    config_module.set_config_path(None)
+
+    # パスを指定せず、既定の場所にも設定ファイルがない場合のみ省略できる
+    assert config_module.load_config(optional=True) is None
+
+    monkeypatch.setenv(config_module.CONFIG_PATH_ENV, str(tmp_path / "missing.toml"))
+    with pytest.raises(FileNotFoundError):
+        config_module.load_config(optional=True)
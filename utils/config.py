@@ -1,5 +1,8 @@
+import os
+import threading
 import tomllib
-from typing import TypedDict
+from pathlib import Path
+from typing import Literal, NotRequired, Optional, TypedDict, overload
 
 
 class Logging(TypedDict):
@@ -13,15 +16,89 @@ class MySQLAccessInfo(TypedDict):
     user: str
 
 
+class MySQLPoolOptions(TypedDict, total=False):
+    max_size: int
+    idle_timeout: float
+    health_check_interval: float
+    acquire_timeout: float
+
+
 class ConfigStructure(TypedDict):
     mysql: MySQLAccessInfo
+    mysql_pool: NotRequired[MySQLPoolOptions]
     logging: Logging
 
 
-def get_config() -> ConfigStructure:
-    with open("config.toml", mode="rb") as f:
+# 設定ファイルのパスを指定する環境変数
+CONFIG_PATH_ENV = "DB_SETUP_TOOL_CONFIG"
+# プロジェクトルートの設定ファイル。カレントディレクトリに設定ファイルがない場合に使う
+_DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent.parent / "config.toml"
+
+_config: Optional[ConfigStructure] = None
+_config_path: Optional[str] = None
+_config_lock = threading.Lock()
+
+
+def set_config_path(path: Optional[str]):
+    """設定ファイルのパスを指定する。読み込み済みの設定は破棄し、次の利用時に読み込み直す"""
+    global _config, _config_path
+    with _config_lock:
+        _config_path = path
+        _config = None
+
+
+def get_config_path() -> str:
+    """設定ファイルのパスを返す
+    set_config_pathで指定したパス、環境変数DB_SETUP_TOOL_CONFIG、カレントディレクトリのconfig.toml、
+    プロジェクトルートのconfig.tomlの順に探す
+    """
+    if _config_path is not None:
+        return _config_path
+    if os.environ.get(CONFIG_PATH_ENV):
+        return os.environ[CONFIG_PATH_ENV]
+    if os.path.exists("config.toml"):
+        return "config.toml"
+    return str(_DEFAULT_CONFIG_PATH)
+
+
+def get_config(path: Optional[str] = None) -> ConfigStructure:
+    """設定ファイルを読み込む。pathを省略した場合はget_config_pathのパスを使う"""
+    with open(path or get_config_path(), mode="rb") as f:
         config = tomllib.load(f)
     return ConfigStructure(**config)
 
 
-config = get_config()
\ No newline at end of file
+def _is_config_path_specified() -> bool:
+    """設定ファイルのパスがset_config_pathか環境変数DB_SETUP_TOOL_CONFIGで指定されているか"""
+    return _config_path is not None or bool(os.environ.get(CONFIG_PATH_ENV))
+
+
+@overload
+def load_config(optional: Literal[False] = False) -> ConfigStructure: ...
+
+
+@overload
+def load_config(optional: bool) -> Optional[ConfigStructure]: ...
+
+
+def load_config(optional: bool = False) -> Optional[ConfigStructure]:
+    """設定を返す。初回の呼び出し時に設定ファイルを読み込み、以降は読み込んだ内容を再利用する
+
+    optional = True: パスが指定されておらず、既定の場所にも設定ファイルがない場合はNoneを返す
+    パスが指定されている場合は、optionalによらずファイルがなければFileNotFoundErrorを送出する(パスの誤りを見逃さないため)
+    """
+    global _config
+    with _config_lock:
+        if _config is None:
+            path = get_config_path()
+            if optional and not _is_config_path_specified() and not os.path.exists(path):
+                return None
+            _config = get_config(path)
+        return _config
+
+
+def __getattr__(name: str):
+    # 従来の utils.config.config は、import時ではなく参照時に読み込む
+    if name == "config":
+        return load_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
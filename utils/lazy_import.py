@@ -0,0 +1,23 @@
+import importlib
+from typing import Any
+
+
+class _LazyModule:
+    """最初に属性を参照した時点で、対象のモジュールをimportして委譲する代理オブジェクト"""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self._name}'>"
+
+
+def lazy_import(name: str) -> Any:
+    """モジュールのimportを最初の利用時まで遅らせる
+    pandas・boto3等の重い依存を、それを使う処理を実行するまで読み込まないために使う
+    型注釈では参照されないよう、利用側のモジュールでは from __future__ import annotations とする
+    """
+    return _LazyModule(name)
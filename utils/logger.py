@@ -1,9 +1,11 @@
 import logging
+from typing import Optional
 
-from utils.config import config
+from utils.config import load_config
 
 
-def get_logger(name, log_level: str = config["logging"]["level"]):
+def get_logger(name, log_level: Optional[str] = None):
+    """ロガーを取得する。log_levelを省略した場合は設定ファイルのlogging.levelを使う"""
     logger = logging.getLogger(name)
     if not logger.handlers:
         handler = logging.StreamHandler()
@@ -13,5 +15,5 @@ def get_logger(name, log_level: str = config["logging"]["level"]):
         )
         handler.setFormatter(formatter)
         logger.addHandler(handler)
-        logger.setLevel(log_level)
+        logger.setLevel(log_level or load_config()["logging"]["level"])
     return logger